@@ -1,10 +1,20 @@
 
+import os
+import sys
+import time
+STARTED = time.perf_counter()  # origin for --profile-startup, before the heavy imports
+# argparse, json, multiprocessing, statistics, platform and subprocess are
+# imported where they're used (main, --batch, --bench, traces): ~35 ms of startup
+import struct
+import threading
+import gc
 import pygame
+import numpy as np
 import random
 import math
-import io
-import wave
-from array import array
+import heapq
+from functools import lru_cache
+from collections import OrderedDict, deque
 
 # --------- Configuration ---------
 SCREEN_WIDTH = 1024
@@ -15,18 +25,34 @@ PADDLE_WIDTH = 120
 PADDLE_HEIGHT = 18
 PADDLE_Y_OFFSET = 48
 BALL_RADIUS = 9
+TRAIL_LENGTH = 12
 BRICK_ROWS_BASE = 6
 BRICK_COLS = 12
 BRICK_AREA_MARGIN = 70
 BRICK_WIDTH = (SCREEN_WIDTH - 140) // BRICK_COLS
 BRICK_HEIGHT = 26
+BRICK_START_Y = 90
 POWERUP_CHANCE = 0.18
 BOMB_BRICK_CHANCE = 0.15  # 15% chance to be a bomb brick
 MAX_LEVEL = 1000
+BRICK_STREAM_MARGIN = 2   # rows materialized past the bottom screen edge up front
 
 POWER_TYPES = ['EXPAND', 'MULTI', 'SLOW', 'LIFE', 'STICKY', 'REVERSE']
 POWER_DURATION = 12.0
 REVERSE_DURATION = 5.0
+PADDLE_MAX_WIDTH = 400
+
+# power-up registry: seconds active, multiplicative modifiers on base values
+# (per stack; picking the same kind up again adds a stack up to max_stacks and
+# restarts its timer), boolean flags, and a one-shot Simulation method
+POWER_EFFECTS = {
+    'EXPAND':  {'duration': POWER_DURATION, 'modifiers': {'paddle_width': 1.5}, 'max_stacks': 3},
+    'MULTI':   {'duration': POWER_DURATION, 'instant': 'split_balls'},
+    'SLOW':    {'duration': POWER_DURATION, 'modifiers': {'ball_speed': 0.6}, 'max_stacks': 1},
+    'LIFE':    {'duration': POWER_DURATION, 'instant': 'add_life'},
+    'STICKY':  {'duration': POWER_DURATION, 'flags': ('sticky',)},
+    'REVERSE': {'duration': REVERSE_DURATION, 'flags': ('reversed',)},
+}
 
 WHITE = (255,255,255)
 BLACK = (0,0,0)
@@ -39,126 +65,700 @@ BG = (10,10,18)
 
 BASE_SPEED = 5.0
 
+# fixed-timestep physics; dt is measured in 60 Hz frames, so one tick == 1.0
+SIM_DT = 1.0
+SUBSTEPS = 4              # collision sub-steps per tick
+MAX_TICKS_PER_FRAME = 8   # after a long hitch, drop time instead of spiralling
+MAX_BOUNCES = 4           # contacts resolved per ball per sub-step
+
+MAX_BALLS = 4096          # ball pool cap (MULTI triples the ball count)
+BALL_CAP_POLICY = 'drop_new'  # or 'replace_oldest' once the cap is reached
+VECTOR_MIN_BALLS = 16     # below this, per-ball Python beats NumPy call overhead
+
+# input log: one byte per simulation tick, plus command bytes (high bit set)
+# for level changes made from the menus/popups
+REPLAY_MAGIC = b'BBRP'
+REPLAY_VERSION = 5        # 2: per-row brick seeds; 3: power-ups as modifiers; 4: swap-removed power-ups; 5: signed seed
+REPLAY_HEADER = '<4sBq'   # magic, version, seed
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_LAUNCH = 4
+REPLAY_COMMAND = 0x80
+CMD_RESET, CMD_NEXT, CMD_PREVIOUS, CMD_RESTART = range(4)
+
+SKY_GRADIENT_STEPS = 120  # time_of_day quantization for the cached sky
+SKY_CACHE_SIZE = 4        # full-screen sky surfaces kept around
+SPRITE_CACHE_SIZE = 256   # pre-rendered brick/powerup/paddle/button surfaces
+TEXT_CACHE_SIZE = 512     # rendered text surfaces
+
+STAR_COUNT = 100
+RAIN_COUNT = 160          # raindrops spawned when the weather turns to rain
+CLOUD_CACHE_SIZE = 32     # pre-rendered cloud sprites, keyed by width
+
+DIRTY_RECTS = False       # opt-in: redraw/update only changed regions (no weather particles)
+DIRTY_RECT_LIMIT = 256    # above this many rects a full flip is cheaper
+
+# mixer channels reserved per sound category; duplicate cues inside one frame
+# collapse into a single play
+SFX_CHANNELS = {'beep': 3, 'pop': 3, 'power': 1, 'explosion': 2}
+SFX_MAX_VOICES = 6        # cap on simultaneously playing effects
+
+# frame profiler: per-phase timings, shown with F3 and/or traced to a file
+PROFILE_PHASES = ('events', 'update', 'collisions', 'background', 'bricks', 'actors',
+                  'hud', 'overlay', 'ui', 'profiler', 'flip')
+PROFILE_HISTORY = 300     # frames kept for the overlay's percentiles and graph
+PROFILE_REFRESH = 15      # frames between overlay table refreshes
+
+# training environment (BreakoutEnv); actions are INPUT_* bitmasks
+ENV_MAX_BALLS = 8         # ball slots in an observation (nearest the paddle first)
+ENV_GRID_ROWS = (SCREEN_HEIGHT - BRICK_START_Y) // BRICK_HEIGHT + 1  # brick rows that reach the screen
+ENV_FRAME_SKIP = 1        # simulation ticks per env step, same action repeated
+ENV_MAX_STEPS = 5 * 60 * FPS
+
+CAPTURE_SCALE = 4         # default downscale factor for captured frames
+CAPTURE_SKIP = 1          # keep every Nth frame
+
+BENCH_SEED = 1234
+BENCH_TOLERANCE = 0.15    # --bench-compare flags medians this much slower than the baseline
+BENCH_GC_FRAMES = 1000    # steady-state frames watched by the GC-pressure check
+
 # --------- Sound helpers (in-memory beeps) ---------
-def make_beep(freq=440, duration_ms=120, volume=0.5, sample_rate=22050):
+SAMPLE_FORMATS = {-8: np.int8, 8: np.uint8, -16: np.int16, 16: np.uint16, 32: np.float32}
+
+def synth(parts, sample_rate, envelope=None):
+    # parts is a sequence of (freq, duration_ms, volume) partials mixed into
+    # one mono float buffer; envelope is an optional (attack_ms, release_ms)
+    # linear fade applied to the whole mix
+    n_total = max(int(sample_rate * duration_ms / 1000) for _, duration_ms, _ in parts)
+    t = np.arange(n_total) / sample_rate
+    mix = np.zeros(n_total)
+    for freq, duration_ms, volume in parts:
+        n = int(sample_rate * duration_ms / 1000)
+        mix[:n] += volume * np.sin(2 * np.pi * freq * t[:n])
+    if envelope:
+        attack = min(n_total, int(sample_rate * envelope[0] / 1000))
+        release = min(n_total, int(sample_rate * envelope[1] / 1000))
+        if attack:
+            mix[:attack] *= np.linspace(0.0, 1.0, attack, endpoint=False)
+        if release:
+            mix[n_total-release:] *= np.linspace(1.0, 0.0, release)
+    return np.clip(mix, -1.0, 1.0)
+
+@lru_cache(maxsize=64)
+def render_sound(parts, envelope, init):
+    # synthesize straight into the mixer's sample format (no WAV round trip)
+    rate, size, channels = init
+    mix = synth(parts, rate, envelope)
+    dtype = SAMPLE_FORMATS[size]
+    if dtype is np.float32:
+        samples = mix.astype(np.float32)
+    else:
+        info = np.iinfo(dtype)
+        mid = (int(info.max) + int(info.min) + 1) // 2
+        samples = (mix * (info.max - mid) + mid).astype(dtype)
+    if channels > 1:
+        samples = np.repeat(samples[:, None], channels, axis=1)
+    return pygame.mixer.Sound(buffer=samples.tobytes())
+
+def make_sound(parts, envelope=None):
+    # memoized per mixer format, so a re-initialised mixer gets fresh buffers
     try:
-        n_samples = int(sample_rate * duration_ms / 1000)
-        buf = array('h')
-        max_amp = int(32767 * volume)
-        for i in range(n_samples):
-            t = i / sample_rate
-            sample = int(max_amp * math.sin(2 * math.pi * freq * t))
-            buf.append(sample)
-        bio = io.BytesIO()
-        wf = wave.open(bio, 'wb')
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(sample_rate)
-        wf.writeframes(buf.tobytes())
-        wf.close()
-        bio.seek(0)
-        return pygame.mixer.Sound(file=bio)
+        init = pygame.mixer.get_init()
+        return render_sound(tuple(parts), envelope, init) if init else None
     except Exception:
         return None
 
-def play_explosion(sfx_list):
-    for s in sfx_list:
-        if s:
-            s.play()
+def make_beep(freq=440, duration_ms=120, volume=0.5):
+    return make_sound(((freq, duration_ms, volume),))
+
+class SoundManager:
+    # Owns the mixer channels. Each category gets its own reserved channels so
+    # a burst of brick pops can't starve an explosion; cues are queued during a
+    # frame and flushed once, so N identical cues cost one play.
+    # Until load() has run (it may run on a background thread) cues are
+    # silently dropped.
+    def __init__(self, channels=SFX_CHANNELS, max_voices=SFX_MAX_VOICES):
+        self.channels = channels
+        self.max_voices = max_voices
+        self.enabled = True
+        self.sounds = {}
+        self.pending = {}
+        self.groups = {}
+        self.started = {}
+
+    def load(self, sounds):
+        if pygame.mixer.get_init() is None:
+            return
+        total = sum(self.channels.values())
+        pygame.mixer.set_num_channels(total)
+        pygame.mixer.set_reserved(total)  # keep bare Sound.play() off our channels
+        groups = {}
+        index = 0
+        for name, count in self.channels.items():
+            groups[name] = [pygame.mixer.Channel(index + k) for k in range(count)]
+            index += count
+        self.sounds = sounds
+        self.groups = groups  # assigned last: flush() treats a non-empty dict as ready
+
+    def trigger(self, name, count=1):
+        if self.enabled:
+            self.pending[name] = self.pending.get(name, 0) + count
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.groups:
+            busy = sum(ch.get_busy() for group in self.groups.values() for ch in group)
+            now = pygame.time.get_ticks()
+            for name in self.pending:
+                sound = self.sounds.get(name)
+                group = self.groups.get(name)
+                if sound is None or not group:
+                    continue
+                channel = next((ch for ch in group if not ch.get_busy()), None)
+                if channel is not None and busy < self.max_voices:
+                    busy += 1
+                else:
+                    # at the cap or out of category channels: retrigger the
+                    # oldest voice in this category instead of adding one
+                    playing = [ch for ch in group if ch.get_busy()]
+                    if not playing:
+                        continue
+                    channel = min(playing, key=lambda ch: self.started.get(ch, 0))
+                channel.play(sound)
+                self.started[channel] = now
+        self.pending.clear()
+
+    def stop(self):
+        self.pending.clear()
+        if self.groups:
+            for group in self.groups.values():
+                for ch in group:
+                    ch.stop()
+
+# --------- Caches ---------
+class LRUCache:
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self.items = OrderedDict()
+
+    def get(self, key, build):
+        try:
+            value = self.items[key]
+            self.items.move_to_end(key)
+            return value
+        except KeyError:
+            pass
+        value = build()
+        self.items[key] = value
+        if len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
+
+def lerp_color(a, b, t):
+    return (int(a[0]*(1-t) + b[0]*t), int(a[1]*(1-t) + b[1]*t), int(a[2]*(1-t) + b[2]*t))
+
+def sky_colors(t):
+    # sky color based on time_of_day (0..1). We'll make cycle: morning(0) -> day(0.25) -> sunset(0.45) -> night(0.65) -> dawn(0.9) -> morning
+    if t < 0.25:  # morning -> day
+        local_t = t / 0.25
+        top = lerp_color((90,140,220), (120,180,255), local_t)
+        bottom = lerp_color((200,220,255), (240,245,255), local_t)
+    elif t < 0.45:  # day -> sunset
+        local_t = (t-0.25) / 0.2
+        top = lerp_color((120,180,255), (240,140,80), local_t)
+        bottom = lerp_color((240,245,255), (250,200,140), local_t)
+    elif t < 0.65:  # sunset -> night
+        local_t = (t-0.45) / 0.2
+        top = lerp_color((240,140,80), (20,30,60), local_t)
+        bottom = lerp_color((250,200,140), (6,10,30), local_t)
+    elif t < 0.9:  # night -> dawn
+        local_t = (t-0.65) / 0.25
+        top = lerp_color((20,30,60), (140,100,180), local_t)
+        bottom = lerp_color((6,10,30), (200,150,200), local_t)
+    else:  # dawn -> morning
+        local_t = (t-0.9) / 0.1
+        top = lerp_color((140,100,180), (90,140,220), local_t)
+        bottom = lerp_color((200,150,200), (200,220,255), local_t)
+    return top, bottom
+
+class SkyCache:
+    # full-screen sky gradients keyed by quantized time_of_day; each one is
+    # built as a 1xH column and stretched, so drawing the sky is one blit
+    def __init__(self, steps=SKY_GRADIENT_STEPS, max_surfaces=SKY_CACHE_SIZE):
+        self.steps = steps
+        self.surfaces = LRUCache(max_surfaces)
+
+    def key(self, time_of_day):
+        return int(time_of_day * self.steps) % self.steps
+
+    def get(self, time_of_day):
+        key = self.key(time_of_day)
+        return self.surfaces.get(key, lambda: self.build(key / self.steps))
+
+    def build(self, t):
+        # same arithmetic as lerp_color, done for the whole column at once
+        top, bottom = (np.array(c, dtype=np.float64) for c in sky_colors(t))
+        f = (np.arange(SCREEN_HEIGHT) / SCREEN_HEIGHT)[:, None]
+        column = pygame.surfarray.make_surface((top*(1-f) + bottom*f).astype(np.uint8)[None])
+        if pygame.display.get_surface() is not None:
+            column = column.convert()  # convert the 1px column, not the full-screen result
+        return pygame.transform.scale(column, (SCREEN_WIDTH, SCREEN_HEIGHT))
+
+FONTS = {}
+FONT_SCAN = None  # background thread enumerating system fonts (fc-list on Linux)
+
+def scan_fonts_async():
+    global FONT_SCAN
+    FONT_SCAN = threading.Thread(target=pygame.sysfont.initsysfonts, name='font-scan', daemon=True)
+    FONT_SCAN.start()
+
+def font_ready(name):
+    # the default font needs no system font scan; named ones need it finished
+    return name is None or FONT_SCAN is None or not FONT_SCAN.is_alive()
+
+def get_font(name, size):
+    # SysFont lookups are slow; load each (name, size) once. Until the
+    # background scan is done a named font stands in with the default one,
+    # which is not cached under the name
+    if not font_ready(name):
+        name = None
+    key = (name, size)
+    font = FONTS.get(key)
+    if font is None:
+        if name is None:
+            font = pygame.font.Font(None, size)
+        else:
+            font = pygame.font.SysFont(name, size)
+        FONTS[key] = font
+    return font
+
+TEXTS = LRUCache(TEXT_CACHE_SIZE)
+
+def render_text(text, size, color, name=None):
+    # keyed on the font actually used, so the text is re-rendered in the
+    # named font once the scan finishes
+    if not font_ready(name):
+        name = None
+    key = (name, size, text, color)
+    return TEXTS.get(key, lambda: get_font(name, size).render(text, True, color))
+
+def build_sprite(kind, color, size, hits, label):
+    w, h = size
+    surf = pygame.Surface((w, h), pygame.SRCALPHA)
+    box = surf.get_rect()
+    if kind == 'brick':
+        base = color
+        pygame.draw.rect(surf, (max(0,base[0]-30), max(0,base[1]-30), max(0,base[2]-30)), box, border_radius=6)
+        pygame.draw.rect(surf, base, box.inflate(-4, -4), border_radius=6)
+        pygame.draw.rect(surf, BLACK, box, 2, border_radius=6)
+        fg, font_size = BLACK, 20
+    elif kind == 'powerup':
+        col = color
+        pygame.draw.rect(surf, (max(0,col[0]-20),max(0,col[1]-20),max(0,col[2]-20)), box, border_radius=6)
+        pygame.draw.rect(surf, col, box.inflate(-6,-6), border_radius=5)
+        pygame.draw.rect(surf, WHITE, box, 2, border_radius=6)
+        fg, font_size = BLACK, 20
+    elif kind == 'paddle':
+        # rounded paddle with gradient and glow
+        pygame.draw.rect(surf, (30,120,220), box, border_radius=12)
+        pygame.draw.rect(surf, (120,200,255), box.inflate(-6, -6), border_radius=10)
+        pygame.draw.rect(surf, WHITE, box, 2, border_radius=12)
+        fg, font_size = WHITE, 20
+    elif kind == 'button':
+        bg, fg = color
+        pygame.draw.rect(surf, bg, box, border_radius=10)
+        pygame.draw.rect(surf, WHITE, box, 2, border_radius=10)
+        font_size = 22
+    else:
+        raise ValueError(f'unknown sprite kind: {kind}')
+    if label:
+        txt = get_font(None, font_size).render(label, True, fg)
+        if kind == 'button':
+            surf.blit(txt, ((w - txt.get_width())//2, (h - txt.get_height())//2))
+        else:
+            surf.blit(txt, (box.centerx - txt.get_width()//2, box.centery - txt.get_height()//2))
+    if pygame.display.get_surface() is not None:
+        surf = surf.convert_alpha()
+    return surf
+
+SPRITES = LRUCache(SPRITE_CACHE_SIZE)
+
+def get_sprite(kind, color, size, hits=0, label=None):
+    # each distinct visual is drawn once and then reused with a single blit;
+    # LRU eviction keeps e.g. EXPAND's many paddle widths from piling up
+    key = (kind, color, size, hits, label)
+    return SPRITES.get(key, lambda: build_sprite(kind, color, size, hits, label))
+
+BALL_SPRITES = {}
+
+def ball_sprites(radius):
+    # glow plus one sprite per trail step (radius/alpha fade), built once per radius
+    sprites = BALL_SPRITES.get(radius)
+    if sprites is None:
+        glow = pygame.Surface((radius*8, radius*8), pygame.SRCALPHA)
+        gx = glow.get_width()//2
+        gy = glow.get_height()//2
+        for i, alpha in enumerate([20, 40, 70, 110]):
+            pygame.draw.circle(glow, (120,200,255,alpha), (gx, gy), radius*2 + i*4)
+        trail = []
+        for i in range(TRAIL_LENGTH):
+            a = max(10, 120 - i*10)
+            r = max(2, radius - i//3)
+            trail_surf = pygame.Surface((r*2, r*2), pygame.SRCALPHA)
+            pygame.draw.circle(trail_surf, (200,230,255,a), (r,r), r)
+            trail.append((trail_surf, r))
+        sprites = BALL_SPRITES[radius] = (glow, gx, gy, trail)
+    return sprites
+
+def clear_render_caches():
+    # fonts, and sprites converted for a display, die with pygame.quit(); a
+    # later Game must not reuse them
+    FONTS.clear()
+    TEXTS.clear()
+    SPRITES.clear()
+    BALL_SPRITES.clear()
+
+# --------- Weather particles ---------
+class WeatherParticles:
+    # stars, clouds and rain stored as NumPy arrays and stepped in batch;
+    # particles that leave the screen are respawned through boolean masks
+    RAIN_COLOR = (180,200,230)
+    STAR_COLOR = (220,240,255)
+
+    def __init__(self, star_count=STAR_COUNT, rain_count=RAIN_COUNT, seed=None):
+        # NumPy only takes non-negative seeds; fold game seeds into 64 bits
+        self.rng = np.random.default_rng(None if seed is None else seed & (2**64 - 1))
+        self.rain_count = rain_count
+        rng = self.rng
+        self.star_x = rng.integers(0, SCREEN_WIDTH, star_count, endpoint=True).astype(np.float32)
+        self.star_y = rng.integers(0, SCREEN_HEIGHT, star_count, endpoint=True).astype(np.float32)
+        self.star_r = rng.choice(np.array([1,2,2]), star_count)
+        self.star_sprites = {}
+        for r in (1, 2):
+            star = pygame.Surface((r*2+1, r*2+1), pygame.SRCALPHA)
+            pygame.draw.circle(star, self.STAR_COLOR, (r, r), r)
+            self.star_sprites[r] = star
+        self.cloud_sprites = LRUCache(CLOUD_CACHE_SIZE)
+        self.set_weather('clear')
+
+    def set_weather(self, weather):
+        rng = self.rng
+        n = int(rng.integers(3, 7, endpoint=True)) if weather in ('clouds','rain') else 0
+        self.cloud_x = rng.integers(-200, SCREEN_WIDTH, n, endpoint=True).astype(np.float32)
+        self.cloud_y = rng.integers(20, 160, n, endpoint=True)
+        self.cloud_w = rng.integers(160, 320, n, endpoint=True)
+        self.cloud_speed = rng.uniform(0.12, 0.4, n).astype(np.float32)
+        n = self.rain_count if weather == 'rain' else 0
+        self.rain_x = rng.integers(0, SCREEN_WIDTH, n, endpoint=True).astype(np.float32)
+        self.rain_y = rng.integers(-SCREEN_HEIGHT, SCREEN_HEIGHT, n, endpoint=True).astype(np.float32)
+        self.rain_len = rng.integers(8, 18, n, endpoint=True)
+        self.rain_speed = rng.uniform(2.0, 4.0, n).astype(np.float32)
+
+    def advance(self, night_intensity):
+        rng = self.rng
+        self.star_y += 0.25 * (1 + 2*night_intensity)
+        gone = self.star_y > SCREEN_HEIGHT
+        if gone.any():
+            self.star_y[gone] = -2
+            self.star_x[gone] = rng.integers(0, SCREEN_WIDTH, int(gone.sum()), endpoint=True)
+        self.cloud_x += self.cloud_speed
+        gone = self.cloud_x > SCREEN_WIDTH + 200
+        if gone.any():
+            self.cloud_x[gone] = -self.cloud_w[gone] - 100
+        self.rain_y += self.rain_speed
+        self.rain_x += 0.6
+        gone = self.rain_y > SCREEN_HEIGHT
+        if gone.any():
+            k = int(gone.sum())
+            self.rain_y[gone] = rng.integers(-SCREEN_HEIGHT, -10, k, endpoint=True)
+            self.rain_x[gone] = rng.integers(0, SCREEN_WIDTH, k, endpoint=True)
+
+    def cloud_sprite(self, w):
+        def build():
+            cloud_surf = pygame.Surface((w, 60), pygame.SRCALPHA)
+            # layered ellipses for soft cloud
+            for i in range(5):
+                pygame.draw.ellipse(cloud_surf, (255,255,255,80), (i*10, 0, w - i*20, 60))
+            return cloud_surf
+        return self.cloud_sprites.get(w, build)
+
+    def draw_stars(self, surf):
+        sprites = self.star_sprites
+        xs = self.star_x.astype(np.int32) - self.star_r
+        ys = self.star_y.astype(np.int32) - self.star_r
+        surf.blits([(sprites[r], (x, y)) for r, x, y in zip(self.star_r.tolist(), xs.tolist(), ys.tolist())], False)
+
+    def draw_clouds(self, surf):
+        if len(self.cloud_x):
+            xs = self.cloud_x.astype(np.int32).tolist()
+            surf.blits([(self.cloud_sprite(w), (x, y)) for x, y, w in zip(xs, self.cloud_y.tolist(), self.cloud_w.tolist())], False)
+
+    def draw_rain(self, surf):
+        # each streak is a 1px line (x,y)->(x+2,y+len); rasterize every drop
+        # at once, one vectorized write per step along the streak
+        if not len(self.rain_x):
+            return
+        try:
+            pixels = pygame.surfarray.pixels3d(surf)
+        except (ValueError, pygame.error):
+            return
+        xs = self.rain_x.astype(np.int32)
+        ys = self.rain_y.astype(np.int32)
+        lens = self.rain_len
+        for k in range(int(lens.max()) + 1):
+            px = xs + (2*k + lens//2) // lens
+            py = ys + k
+            ok = (k <= lens) & (py >= 0) & (py < SCREEN_HEIGHT) & (px >= 0) & (px < SCREEN_WIDTH)
+            pixels[px[ok], py[ok]] = self.RAIN_COLOR
+        del pixels
 
 # --------- Game objects ---------
 class Paddle:
+    __slots__ = ('width', 'height', 'x', 'y', 'speed', 'box')
+
     def __init__(self):
         self.width = PADDLE_WIDTH
         self.height = PADDLE_HEIGHT
         self.x = (SCREEN_WIDTH - self.width) // 2
         self.y = SCREEN_HEIGHT - PADDLE_Y_OFFSET
         self.speed = 10
+        self.box = pygame.Rect(0, 0, 0, 0)
 
     def rect(self):
-        return pygame.Rect(self.x, self.y, self.width, self.height)
+        # one Rect updated in place; copy it to keep a snapshot
+        self.box.update(self.x, self.y, self.width, self.height)
+        return self.box
 
     def move(self, dx):
         self.x += dx * self.speed
         self.x = max(0, min(SCREEN_WIDTH - self.width, self.x))
 
     def draw(self, surf):
-        # rounded paddle with gradient and glow
         rect = self.rect()
-        pygame.draw.rect(surf, (30,120,220), rect, border_radius=12)
-        inner = rect.inflate(-6, -6)
-        pygame.draw.rect(surf, (120,200,255), inner, border_radius=10)
-        pygame.draw.rect(surf, WHITE, rect, 2, border_radius=12)
-
-class Ball:
-    def __init__(self, x, y, vx=None, vy=None):
-        self.x = x
-        self.y = y
-        angle = random.uniform(-1.0, 1.0)
-        speed = BASE_SPEED
-        self.vx = vx if vx is not None else (angle * speed)
-        self.vy = vy if vy is not None else -abs(speed)
-        self.radius = BALL_RADIUS
-        self.stuck = True
-        self.trail = []
-
-    def rect(self):
-        return pygame.Rect(int(self.x-self.radius), int(self.y-self.radius), self.radius*2, self.radius*2)
-
-    def update(self, dt):
-        if self.stuck:
+        surf.blit(get_sprite('paddle', None, rect.size), rect)
+
+class BallPool:
+    # Structure-of-arrays storage for every ball: position, velocity, radius,
+    # stuck flag and a ring of trail points live in NumPy arrays so walls,
+    # paddle tests and culling run over all balls at once. Order is spawn
+    # order; removal compacts the arrays.
+    def __init__(self, capacity=16, cap=MAX_BALLS, policy=BALL_CAP_POLICY, rng=random):
+        if policy not in ('drop_new', 'replace_oldest'):
+            raise ValueError(f'unknown ball cap policy: {policy}')
+        self.cap = cap
+        self.policy = policy
+        self.rng = rng
+        self.n = 0
+        self.trail_head = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        old_n = self.n
+        arrays = {
+            'x': np.zeros(capacity), 'y': np.zeros(capacity),
+            'vx': np.zeros(capacity), 'vy': np.zeros(capacity),
+            'radius': np.full(capacity, BALL_RADIUS, dtype=np.int32),
+            'stuck': np.zeros(capacity, dtype=bool),
+            'trail_x': np.zeros((capacity, TRAIL_LENGTH), dtype=np.float32),
+            'trail_y': np.zeros((capacity, TRAIL_LENGTH), dtype=np.float32),
+            'trail_count': np.zeros(capacity, dtype=np.int32),
+        }
+        for name, arr in arrays.items():
+            if old_n:
+                arr[:old_n] = getattr(self, name)[:old_n]
+            setattr(self, name, arr)
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        # views are only valid until the pool is next compacted
+        for i in range(self.n):
+            yield Ball(self, i)
+
+    def __getitem__(self, i):
+        if not -self.n <= i < self.n:
+            raise IndexError('ball index out of range')
+        return Ball(self, i % self.n)
+
+    def clear(self):
+        self.n = 0
+
+    def spawn(self, x, y, vx=None, vy=None, stuck=True):
+        if vx is None:
+            vx = self.rng.uniform(-1.0, 1.0) * BASE_SPEED
+        if vy is None:
+            vy = -abs(BASE_SPEED)
+        return self.spawn_many([x], [y], [vx], [vy], stuck)
+
+    def spawn_many(self, xs, ys, vxs, vys, stuck=False):
+        k = len(xs)
+        if self.n + k > self.cap:
+            if self.policy == 'drop_new':
+                k = self.cap - self.n
+                xs, ys, vxs, vys = xs[:k], ys[:k], vxs[:k], vys[:k]
+            else:
+                k = min(k, self.cap)
+                xs, ys, vxs, vys = xs[-k:], ys[-k:], vxs[-k:], vys[-k:]
+                drop = self.n + k - self.cap
+                if drop > 0:
+                    self.remove(np.arange(self.n) < drop)
+        if k <= 0:
+            return 0
+        if self.n + k > len(self.x):
+            self.allocate(max(self.n + k, len(self.x) * 2))
+        s = slice(self.n, self.n + k)
+        self.x[s] = xs
+        self.y[s] = ys
+        self.vx[s] = vxs
+        self.vy[s] = vys
+        self.radius[s] = BALL_RADIUS
+        self.stuck[s] = stuck
+        self.trail_count[s] = 0
+        self.n += k
+        return k
+
+    def remove(self, mask):
+        # drop every ball where mask is true, keeping spawn order
+        keep = np.flatnonzero(~mask[:self.n])
+        k = len(keep)
+        if k == self.n:
             return
-        self.x += self.vx * dt
-        self.y += self.vy * dt
-        if self.x - self.radius <= 0:
-            self.x = self.radius
-            self.vx *= -1
-        if self.x + self.radius >= SCREEN_WIDTH:
-            self.x = SCREEN_WIDTH - self.radius
-            self.vx *= -1
-        if self.y - self.radius <= 0:
-            self.y = self.radius
-            self.vy *= -1
-        self.trail.insert(0, (self.x, self.y))
-        if len(self.trail) > 12:
-            self.trail.pop()
+        for arr in (self.x, self.y, self.vx, self.vy, self.radius, self.stuck,
+                    self.trail_x, self.trail_y, self.trail_count):
+            arr[:k] = arr[keep]
+        self.n = k
+
+    def push_trail(self):
+        n = self.n
+        self.trail_head = (self.trail_head + 1) % TRAIL_LENGTH
+        self.trail_x[:n, self.trail_head] = self.x[:n]
+        self.trail_y[:n, self.trail_head] = self.y[:n]
+        count = self.trail_count[:n]
+        np.minimum(count + 1, TRAIL_LENGTH, out=count)
+        count[self.stuck[:n]] = 0
 
     def draw(self, surf):
-        glow_surf = pygame.Surface((self.radius*8, self.radius*8), pygame.SRCALPHA)
-        gx = glow_surf.get_width()//2
-        gy = glow_surf.get_height()//2
-        for i, alpha in enumerate([20, 40, 70, 110]):
-            pygame.draw.circle(glow_surf, (120,200,255,alpha), (gx, gy), self.radius*2 + i*4)
-        surf.blit(glow_surf, (int(self.x - gx), int(self.y - gy)), special_flags=pygame.BLEND_PREMULTIPLIED)
-        for i, (tx,ty) in enumerate(self.trail):
-            a = max(10, 120 - i*10)
-            r = max(2, self.radius - i//3)
-            trail_surf = pygame.Surface((r*2, r*2), pygame.SRCALPHA)
-            pygame.draw.circle(trail_surf, (200,230,255,a), (r,r), r)
-            surf.blit(trail_surf, (int(tx-r), int(ty-r)))
-        pygame.draw.circle(surf, WHITE, (int(self.x), int(self.y)), self.radius)
-        pygame.draw.circle(surf, (200,240,255), (int(self.x-2), int(self.y-2)), max(1, self.radius//2))
+        # glows and trail dots go out in two batched blits() calls
+        n = self.n
+        if not n:
+            return
+        xs = self.x[:n].astype(np.int32).tolist()
+        ys = self.y[:n].astype(np.int32).tolist()
+        radii = self.radius[:n].tolist()
+        counts = self.trail_count[:n].tolist()
+        head = self.trail_head
+        order = [(head - k) % TRAIL_LENGTH for k in range(TRAIL_LENGTH)]
+        glows = []
+        dots = []
+        for i in range(n):
+            glow, gx, gy, trail_sprites = ball_sprites(radii[i])
+            glows.append((glow, (xs[i] - gx, ys[i] - gy), None, pygame.BLEND_PREMULTIPLIED))
+            if counts[i]:
+                tx = self.trail_x[i].tolist()
+                ty = self.trail_y[i].tolist()
+                for k in range(counts[i]):
+                    trail_surf, r = trail_sprites[k]
+                    j = order[k]
+                    dots.append((trail_surf, (int(tx[j]-r), int(ty[j]-r))))
+        surf.blits(glows, False)
+        surf.blits(dots, False)
+        for i in range(n):
+            r = radii[i]
+            pygame.draw.circle(surf, WHITE, (xs[i], ys[i]), r)
+            pygame.draw.circle(surf, (200,240,255), (xs[i]-2, ys[i]-2), max(1, r//2))
+
+class Ball:
+    # lightweight view of one BallPool slot
+    __slots__ = ('pool', 'i')
+
+    def __init__(self, pool, i):
+        self.pool = pool
+        self.i = i
+
+    x = property(lambda self: float(self.pool.x[self.i]), lambda self, v: self.pool.x.__setitem__(self.i, v))
+    y = property(lambda self: float(self.pool.y[self.i]), lambda self, v: self.pool.y.__setitem__(self.i, v))
+    vx = property(lambda self: float(self.pool.vx[self.i]), lambda self, v: self.pool.vx.__setitem__(self.i, v))
+    vy = property(lambda self: float(self.pool.vy[self.i]), lambda self, v: self.pool.vy.__setitem__(self.i, v))
+    radius = property(lambda self: int(self.pool.radius[self.i]))
+    stuck = property(lambda self: bool(self.pool.stuck[self.i]), lambda self, v: self.pool.stuck.__setitem__(self.i, v))
+
+    @property
+    def trail(self):
+        pool = self.pool
+        for k in range(int(pool.trail_count[self.i])):
+            j = (pool.trail_head - k) % TRAIL_LENGTH
+            yield float(pool.trail_x[self.i, j]), float(pool.trail_y[self.i, j])
+
+    def dirty_rect(self, rect):
+        # glow box plus every trail point, written into `rect`
+        r = self.radius*4
+        left = right = self.x
+        top = bottom = self.y
+        for tx, ty in self.trail:
+            left = min(left, tx)
+            right = max(right, tx)
+            top = min(top, ty)
+            bottom = max(bottom, ty)
+        rect.update(int(left-r)-1, int(top-r)-1, int(right-left)+r*2+3, int(bottom-top)+r*2+3)
+        return rect
+
+BRICK_KINDS = ('normal', 'bomb')
 
 class Brick:
-    def __init__(self, row, col, x, y, w, h, hits=1, color=(180,80,80), kind='normal'):
+    # lightweight view of one cell of a BrickGrid; attribute reads and writes
+    # go straight to the grid's arrays, so views are cheap to make and drop
+    __slots__ = ('grid', 'row', 'col')
+
+    def __init__(self, grid, row, col):
+        self.grid = grid
         self.row = row
         self.col = col
-        self.rect = pygame.Rect(x,y,w,h)
-        self.hits = hits
-        self.color = color
-        self.kind = kind
+
+    @property
+    def rect(self):
+        return pygame.Rect(BRICK_AREA_MARGIN + self.col * BRICK_WIDTH, BRICK_START_Y + self.row * BRICK_HEIGHT,
+                           BRICK_WIDTH-6, BRICK_HEIGHT-6)
+
+    @property
+    def center(self):
+        # same point as rect.center, without building the Rect
+        return (BRICK_AREA_MARGIN + self.col * BRICK_WIDTH + (BRICK_WIDTH-6) // 2,
+                BRICK_START_Y + self.row * BRICK_HEIGHT + (BRICK_HEIGHT-6) // 2)
+
+    @property
+    def hits(self):
+        return int(self.grid.hits[self.row, self.col])
+
+    @hits.setter
+    def hits(self, value):
+        self.grid.hits[self.row, self.col] = value
+        self.grid.version += 1
+
+    @property
+    def kind(self):
+        return BRICK_KINDS[self.grid.kind[self.row, self.col]]
+
+    @property
+    def color(self):
+        return self.grid.palette[self.grid.color[self.row, self.col]]
+
+    def __eq__(self, other):
+        return isinstance(other, Brick) and (self.grid, self.row, self.col) == (other.grid, other.row, other.col)
+
+    def __hash__(self):
+        return hash((id(self.grid), self.row, self.col))
 
     def draw(self, surf):
-        box = self.rect
-        base = self.color
-        inner = box.inflate(-4, -4)
-        pygame.draw.rect(surf, (max(0,base[0]-30), max(0,base[1]-30), max(0,base[2]-30)), box, border_radius=6)
-        pygame.draw.rect(surf, base, inner, border_radius=6)
-        pygame.draw.rect(surf, BLACK, box, 2, border_radius=6)
-        if self.kind == 'bomb':
-            font = pygame.font.SysFont(None, 20)
-            t = font.render('B', True, BLACK)
-            surf.blit(t, (box.centerx - t.get_width()//2, box.centery - t.get_height()//2))
+        label = 'B' if self.kind == 'bomb' else None
+        surf.blit(get_sprite('brick', self.color, (BRICK_WIDTH-6, BRICK_HEIGHT-6), self.hits, label), self.rect)
 
 class PowerUp:
     SIZE = 26
@@ -171,258 +771,1278 @@ class PowerUp:
         'STICKY': 'S',
         'REVERSE': '<>'
     }
+    COLORS = {
+        'EXPAND': (120,180,255),
+        'MULTI': (255,200,80),
+        'SLOW': (150,150,255),
+        'LIFE': (90,220,140),
+        'STICKY': (200,160,255),
+        'REVERSE': (255,110,110)
+    }
+    __slots__ = ('x', 'y', 'kind', 'rect')
+
     def __init__(self, x, y, kind):
+        self.rect = pygame.Rect(0, 0, PowerUp.SIZE, PowerUp.SIZE)
+        self.reset(x, y, kind)
+
+    def reset(self, x, y, kind):
         self.x = x
         self.y = y
         self.kind = kind
-        self.rect = pygame.Rect(x, y, PowerUp.SIZE, PowerUp.SIZE)
+        self.rect.topleft = (x, y)
+        return self
 
     def update(self, dt):
         self.y += PowerUp.SPEED * dt
         self.rect.topleft = (int(self.x), int(self.y))
 
     def draw(self, surf):
-        col = {
-            'EXPAND': (120,180,255),
-            'MULTI': (255,200,80),
-            'SLOW': (150,150,255),
-            'LIFE': (90,220,140),
-            'STICKY': (200,160,255),
-            'REVERSE': (255,110,110)
-        }.get(self.kind, WHITE)
-        r = pygame.Rect(int(self.x), int(self.y), PowerUp.SIZE, PowerUp.SIZE)
-        pygame.draw.rect(surf, (max(0,col[0]-20),max(0,col[1]-20),max(0,col[2]-20)), r, border_radius=6)
-        pygame.draw.rect(surf, col, r.inflate(-6,-6), border_radius=5)
-        pygame.draw.rect(surf, WHITE, r, 2, border_radius=6)
-        font = pygame.font.SysFont(None, 20)
-        txt = font.render(PowerUp.ICONS.get(self.kind, '?'), True, BLACK)
-        surf.blit(txt, (r.centerx - txt.get_width()//2, r.centery - txt.get_height()//2))
+        col = PowerUp.COLORS.get(self.kind, WHITE)
+        sprite = get_sprite('powerup', col, (PowerUp.SIZE, PowerUp.SIZE), 0, PowerUp.ICONS.get(self.kind, '?'))
+        surf.blit(sprite, (int(self.x), int(self.y)))
 
 # --------- Helpers ---------
-
-def create_bricks(level_rows):
-    bricks = []
-    margin_x = BRICK_AREA_MARGIN
-    start_y = 90
-    for row in range(level_rows):
+class LevelSpec:
+    # compact, seeded description of a level's rows: each row has its own RNG
+    # stream, so any row can be generated on its own and in any order
+    def __init__(self, seed, rows):
+        self.seed = seed
+        self.rows = rows
+
+    def row(self, row):
+        # (col, hits, kind) for every brick in the row
+        rng = random.Random(self.seed * 1000003 + row)
         pattern = [1]*BRICK_COLS
-        for g in range(random.randint(0,3)):
-            idx = random.randrange(BRICK_COLS)
+        for g in range(rng.randint(0,3)):
+            idx = rng.randrange(BRICK_COLS)
             pattern[idx] = 0
-        if random.random() < 0.4:
-            random.shuffle(pattern)
+        if rng.random() < 0.4:
+            rng.shuffle(pattern)
+        cells = []
         for col in range(BRICK_COLS):
             if pattern[col] == 0:
                 continue
-            x = margin_x + col * BRICK_WIDTH
-            y = start_y + row * BRICK_HEIGHT
-            hits = 1 + (1 if random.random() < 0.12 else 0)
-            kind = 'bomb' if random.random() < BOMB_BRICK_CHANCE else 'normal'
-            color = row_color(row, level_rows) if kind=='normal' else ORANGE
-            bricks.append(Brick(row, col, x, y, BRICK_WIDTH-6, BRICK_HEIGHT-6, hits, color, kind))
-    return bricks
+            hits = 1 + (1 if rng.random() < 0.12 else 0)
+            kind = 'bomb' if rng.random() < BOMB_BRICK_CHANCE else 'normal'
+            cells.append((col, hits, kind))
+        return cells
+
+class BrickGrid:
+    # Struct-of-arrays store over the fixed (row, col) layout used by
+    # create_bricks: alive mask, hits, kind and a palette index per cell.
+    # Removal clears the alive bit; Brick views are handed out on lookup.
+    # With a LevelSpec only the rows that can be seen or reached are filled
+    # up front; the rest are materialized when something looks them up (a
+    # bomb chain running off the bottom of the screen)
+    def __init__(self, rows, spec=None):
+        self.rows = rows
+        self.alive = np.zeros((rows, BRICK_COLS), dtype=bool)
+        self.hits = np.zeros((rows, BRICK_COLS), dtype=np.int8)
+        self.kind = np.zeros((rows, BRICK_COLS), dtype=np.uint8)
+        self.color = np.zeros((rows, BRICK_COLS), dtype=np.uint8)
+        self.palette = []
+        self.palette_index = {}
+        self.count = 0
+        self.changed = None  # list of hit/removed bricks once track_changes() is on
+        self.bottom = 0      # lowest edge any materialized brick has occupied (conservative)
+        self.spec = spec
+        self.pending = set()
+        self.pending_count = None  # bricks in pending rows, counted on first len()
+        self.version = 0           # bumped on every add, removal or hit
+        self.blit_key = None
+        self.blit_list = None
+        if spec is not None:
+            window = min((SCREEN_HEIGHT - BRICK_START_Y) // BRICK_HEIGHT + 1 + BRICK_STREAM_MARGIN, rows)
+            self.pending = set(range(window, rows))
+            for row in range(window):
+                self.fill(row)
+
+    def fill(self, row):
+        cells = self.spec.row(row)
+        for col, hits, kind in cells:
+            self.add(row, col, hits, kind, row_color(row, self.rows) if kind=='normal' else ORANGE)
+        return len(cells)
+
+    def materialize(self, row):
+        if row in self.pending:
+            self.pending.discard(row)
+            added = self.fill(row)
+            if self.pending_count is not None:
+                self.pending_count -= added
+
+    def add(self, row, col, hits=1, kind='normal', color=(180,80,80)):
+        index = self.palette_index.get(color)
+        if index is None:
+            index = self.palette_index[color] = len(self.palette)
+            self.palette.append(color)
+        if not self.alive[row, col]:
+            self.count += 1
+        self.alive[row, col] = True
+        self.version += 1
+        self.hits[row, col] = hits
+        self.kind[row, col] = BRICK_KINDS.index(kind)
+        self.color[row, col] = index
+        self.bottom = max(self.bottom, BRICK_START_Y + row * BRICK_HEIGHT + BRICK_HEIGHT-6)
+        return Brick(self, row, col)
+
+    def get(self, row, col):
+        if not (0 <= row < self.rows and 0 <= col < BRICK_COLS):
+            return None
+        if self.pending and row in self.pending:
+            self.materialize(row)
+        return Brick(self, row, col) if self.alive[row, col] else None
+
+    def remove(self, brick):
+        row, col = brick.row, brick.col
+        if brick.grid is not self or not self.alive[row, col]:
+            raise ValueError('brick not in grid')
+        self.alive[row, col] = False
+        self.version += 1
+        self.count -= 1
+        if self.changed is not None:
+            self.changed.append(brick)
+
+    def track_changes(self):
+        if self.changed is None:
+            self.changed = []
+
+    def touch(self, brick):
+        # a brick was hit but survived; its cell needs repainting
+        if self.changed is not None:
+            self.changed.append(brick)
+
+    def __contains__(self, brick):
+        return brick.grid is self and bool(self.alive[brick.row, brick.col])
+
+    def __iter__(self):
+        rows, cols = np.nonzero(self.alive)
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            yield Brick(self, r, c)
+
+    def __len__(self):
+        if self.pending and self.pending_count is None:
+            self.pending_count = sum(len(self.spec.row(r)) for r in self.pending)
+        return self.count + (self.pending_count if self.pending else 0)
+
+    def __bool__(self):
+        # cheap emptiness test: every generated row holds at least one brick
+        return bool(self.count or self.pending)
+
+    def draw(self, surf):
+        # one batched blit of every live brick in rows that reach the screen;
+        # the blit list is rebuilt only after the grid has changed
+        visible = min(self.rows, (surf.get_height() - BRICK_START_Y) // BRICK_HEIGHT + 1)
+        if self.blit_key != (self.version, visible):
+            self.blit_list = self.blits(visible)
+            self.blit_key = (self.version, visible)
+        if self.blit_list:
+            surf.blits(self.blit_list, doreturn=False)
+
+    def blits(self, visible):
+        rows, cols = np.nonzero(self.alive[:visible])
+        hits = self.hits[rows, cols].tolist()
+        bombs = self.kind[rows, cols].tolist()
+        colors = self.color[rows, cols].tolist()
+        palette = self.palette
+        size = (BRICK_WIDTH-6, BRICK_HEIGHT-6)
+        return [(get_sprite('brick', palette[k], size, h, 'B' if b else None),
+                 (BRICK_AREA_MARGIN + c * BRICK_WIDTH, BRICK_START_Y + r * BRICK_HEIGHT))
+                for r, c, h, b, k in zip(rows.tolist(), cols.tolist(), hits, bombs, colors)]
+
+    def cells(self, left, top, right, bottom):
+        # inclusive (r0, r1, c0, c1) grid range under the box, with those rows
+        # materialized, or None when it covers no cells or the grid is empty
+        if not self.count and not self.pending:
+            return None
+        c0 = max(0, (left - BRICK_AREA_MARGIN) // BRICK_WIDTH)
+        c1 = min(BRICK_COLS - 1, (right - BRICK_AREA_MARGIN) // BRICK_WIDTH)
+        r0 = max(0, (top - BRICK_START_Y) // BRICK_HEIGHT)
+        r1 = min(self.rows - 1, (bottom - BRICK_START_Y) // BRICK_HEIGHT)
+        if r0 > r1 or c0 > c1:
+            return None
+        if self.pending:
+            for r in range(r0, r1 + 1):
+                self.materialize(r)
+        return r0, r1, c0, c1
+
+def ray_box(x, y, dx, dy, left, top, right, bottom):
+    # slab test for the segment p + t*d, t in [0, 1]; returns (t, nx, ny) of
+    # the entry face, or None if the segment misses or starts inside
+    t_enter, t_exit = 0.0, 1.0
+    nx = ny = 0.0
+    if dx == 0:
+        if x <= left or x >= right:
+            return None
+    else:
+        t0 = (left - x) / dx
+        t1 = (right - x) / dx
+        n = -1.0
+        if t0 > t1:
+            t0, t1, n = t1, t0, 1.0
+        if t0 > t_enter:
+            t_enter, nx, ny = t0, n, 0.0
+        t_exit = min(t_exit, t1)
+    if dy == 0:
+        if y <= top or y >= bottom:
+            return None
+    else:
+        t0 = (top - y) / dy
+        t1 = (bottom - y) / dy
+        n = -1.0
+        if t0 > t1:
+            t0, t1, n = t1, t0, 1.0
+        if t0 > t_enter:
+            t_enter, nx, ny = t0, 0.0, n
+        t_exit = min(t_exit, t1)
+    if t_enter > t_exit or (nx == 0 and ny == 0):
+        return None
+    return t_enter, nx, ny
+
+def ray_circle(x, y, dx, dy, cx, cy, r):
+    fx = x - cx
+    fy = y - cy
+    c = fx*fx + fy*fy - r*r
+    if c <= 0:
+        return None
+    a = dx*dx + dy*dy
+    b = fx*dx + fy*dy
+    if a == 0 or b >= 0:
+        return None
+    disc = b*b - a*c
+    if disc < 0:
+        return None
+    t = (-b - math.sqrt(disc)) / a
+    if t > 1:
+        return None
+    return t, (fx + dx*t) / r, (fy + dy*t) / r
+
+def sweep_circle_rect(x, y, dx, dy, r, left, top, right, bottom):
+    # exact swept-circle vs AABB: the box's Minkowski sum with the circle is
+    # two inflated boxes plus four corner circles; the earliest entry wins.
+    # The box comes in as plain numbers so the hot path builds no Rects.
+    best = ray_box(x, y, dx, dy, left - r, top, right + r, bottom)
+    hit = ray_box(x, y, dx, dy, left, top - r, right, bottom + r)
+    if hit is not None and (best is None or hit[0] < best[0]):
+        best = hit
+    for cx, cy in ((left, top), (right, top), (left, bottom), (right, bottom)):
+        hit = ray_circle(x, y, dx, dy, cx, cy, r)
+        if hit is not None and (best is None or hit[0] < best[0]):
+            best = hit
+    return best
+
+def create_bricks(level_rows, rng=random):
+    # one draw from rng seeds the whole level; rows are built as needed
+    return BrickGrid(level_rows, LevelSpec(rng.getrandbits(64), level_rows))
 
 def row_color(row, total_rows):
     palettes = [ (200,90,90), (230,150,90), (200,200,90), (120,200,140), (100,160,230), (160,120,220) ]
     return palettes[row % len(palettes)]
 
 def explode_brick(target, bricks, score_ref):
-    to_check = [(target.row, target.col)]
+    # breadth-first chain reaction over the grid; each cell is visited once
+    to_check = deque([(target.row, target.col)])
+    visited = {(target.row, target.col)}
     destroyed = []
     while to_check:
-        r,c = to_check.pop()
-        for b in list(bricks):
-            if b.row == r and b.col == c:
-                destroyed.append(b)
-                try:
-                    bricks.remove(b)
-                except ValueError:
-                    pass
-                score_ref[0] += 15
-                if b.kind == 'bomb':
-                    neighbors = [(r-1,c),(r+1,c),(r,c-1),(r,c+1)]
-                    for nr,nc in neighbors:
-                        to_check.append((nr,nc))
-                break
+        r,c = to_check.popleft()
+        b = bricks.get(r, c)
+        if b is None:
+            continue
+        destroyed.append(b)
+        bricks.remove(b)
+        score_ref[0] += 15
+        if b.kind == 'bomb':
+            for cell in ((r-1,c),(r+1,c),(r,c-1),(r,c+1)):
+                if cell not in visited:
+                    visited.add(cell)
+                    to_check.append(cell)
     return destroyed
 
 # --------- UI Button helper ---------
 class Button:
-    def __init__(self, rect, label):
+    # `action` names what a click does (State handlers are keyed by it);
+    # it defaults to the label for buttons whose label never changes
+    def __init__(self, rect, label, action=None):
         self.rect = pygame.Rect(rect)
         self.label = label
+        self.action = label if action is None else action
 
     def draw(self, surf, bg=(40,40,60), fg=WHITE):
-        pygame.draw.rect(surf, bg, self.rect, border_radius=10)
-        pygame.draw.rect(surf, WHITE, self.rect, 2, border_radius=10)
-        font = pygame.font.SysFont(None, 22)
-        txt = font.render(self.label, True, fg)
-        surf.blit(txt, (self.rect.x + (self.rect.width - txt.get_width())//2, self.rect.y + (self.rect.height - txt.get_height())//2))
+        surf.blit(get_sprite('button', (bg, fg), self.rect.size, 0, self.label), self.rect)
 
     def clicked(self, pos):
         return self.rect.collidepoint(pos)
 
+# --------- Game states ---------
+class State:
+    # One screen of the game. `handlers` maps (event type, key) to a
+    # callable: key is the pygame key for KEYDOWN, the clicked button's
+    # action for MOUSEBUTTONDOWN, and None matches any event of that type.
+    # `buttons` returns the clickable Buttons, `update(dt)` runs each frame
+    # and `draw` paints the whole screen. Game-view states draw the playing
+    # field with `overlay` on top; static ones don't change while shown,
+    # so the dirty renderer presents them once and then skips them.
+    __slots__ = ('name', 'draw', 'update', 'handlers', 'buttons', 'overlay', 'game_view', 'static')
+
+    def __init__(self, name, draw, update=None, handlers=None, buttons=None, overlay=None,
+                 game_view=False, static=False):
+        self.name = name
+        self.draw = draw
+        self.update = update
+        self.handlers = handlers or {}
+        self.buttons = buttons or (lambda: ())
+        self.overlay = overlay
+        self.game_view = game_view
+        self.static = static
+
+    def handler(self, event):
+        key = None
+        if event.type == pygame.KEYDOWN:
+            key = event.key
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            for b in self.buttons():
+                if b.clicked(event.pos):
+                    key = b.action
+                    break
+        handler = self.handlers.get((event.type, key))
+        if handler is None and key is not None:
+            handler = self.handlers.get((event.type, None))
+        return handler
+
+# --------- Simulation ---------
+class Simulation:
+    # Paddle/ball/brick/power-up rules with no display, mixer or keyboard
+    # access: input comes in through step() and sound cues go out through
+    # self.events, so it can be stepped headless as fast as the CPU allows.
+    # state is 'playing', 'cleared', 'max_level' or 'game_over'. All
+    # randomness comes from self.rng, so a seed plus the input log from
+    # start_recording() reproduces a session exactly.
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.SystemRandom().randrange(2**63)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.log = None
+        self.level = 1
+        self.best_level = 1
+        self.lives = 3
+        self.score = 0
+        self.time = 0.0             # simulated frames since the session started
+        self.active_powers = {}     # kind -> (expires at self.time, stacks)
+        self.expiries = []          # heap of (expires, kind); stale entries are skipped
+        self.modifiers = {}
+        self.is_reversed = False
+        self.sticky = False
+        self.ball_speed = 1.0
+        self.events = []
+        self.timing = False         # when set, collision time accumulates here
+        self.collision_time = 0.0
+        self.powerups = []
+        self.spare_powerups = []    # free list: caught or missed PowerUps are reused
+        self.reset_level()
+
+    def reset_level(self):
+        self.accumulator = 0.0
+        self.pending_launch = False
+        self.state = 'playing'
+        self.paddle = Paddle()
+        self.apply_modifiers()
+        self.balls = BallPool(rng=self.rng)
+        self.balls.spawn(self.paddle.x + self.paddle.width//2, self.paddle.y - BALL_RADIUS - 2)
+        rows = BRICK_ROWS_BASE + (self.level // 3)
+        self.bricks = create_bricks(rows, self.rng)
+        self.spare_powerups.extend(self.powerups)
+        self.powerups.clear()
+
+    def restart(self):
+        self.level = 1
+        self.score = 0
+        self.lives = 3
+        self.active_powers.clear()
+        self.expiries.clear()
+        self.reset_level()
+
+    def start_recording(self):
+        # checked up front: the seed has to fit the replay header at save time
+        if not -2**63 <= self.seed < 2**63:
+            raise ValueError(f'seed {self.seed} does not fit in a replay (signed 64-bit)')
+        self.log = InputLog(self.seed)
+        return self.log
+
+    def command(self, cmd):
+        # level changes made outside step(), recorded so replays follow them
+        if self.log is not None:
+            self.log.command(cmd)
+        if cmd == CMD_NEXT:
+            if self.level < MAX_LEVEL:
+                self.level += 1
+            self.reset_level()
+        elif cmd == CMD_PREVIOUS:
+            if self.level > 1:
+                self.level -= 1
+            self.reset_level()
+        elif cmd == CMD_RESTART:
+            self.restart()
+        elif cmd == CMD_RESET:
+            self.reset_level()
+        else:
+            raise ValueError(f'unknown command: {cmd}')
+
+    def launch(self):
+        pool = self.balls
+        for i in np.flatnonzero(pool.stuck[:pool.n]):
+            pool.stuck[i] = False
+            pool.vx[i] = self.rng.choice([-BASE_SPEED, -BASE_SPEED+1, BASE_SPEED-1, BASE_SPEED])
+            pool.vy[i] = -abs(BASE_SPEED)
+
+    def spawn_power(self, x, y):
+        if self.rng.random() < POWERUP_CHANCE:
+            kind = self.rng.choice(POWER_TYPES)
+            if self.spare_powerups:
+                self.powerups.append(self.spare_powerups.pop().reset(x-12, y-12, kind))
+            else:
+                self.powerups.append(PowerUp(x-12, y-12, kind))
+
+    def apply_power(self, kind):
+        effect = POWER_EFFECTS[kind]
+        expires = self.time + effect['duration'] * FPS
+        stacks = self.active_powers.get(kind, (0, 0))[1]
+        self.active_powers[kind] = (expires, min(stacks + 1, effect.get('max_stacks', 1)))
+        heapq.heappush(self.expiries, (expires, kind))
+        if 'instant' in effect:
+            getattr(self, effect['instant'])()
+        self.apply_modifiers()
+        self.events.append('power')
+
+    def expire_powers(self):
+        # pop only the timers that are due; a refreshed power leaves its old
+        # heap entry behind, which no longer matches and is dropped
+        expiries = self.expiries
+        expired = False
+        while expiries and expiries[0][0] <= self.time:
+            expires, kind = heapq.heappop(expiries)
+            active = self.active_powers.get(kind)
+            if active is not None and active[0] == expires:
+                del self.active_powers[kind]
+                expired = True
+        if expired:
+            self.apply_modifiers()
+
+    def apply_modifiers(self):
+        # recompute derived values from base values and the active effects
+        modifiers = {'paddle_width': 1.0, 'ball_speed': 1.0}
+        flags = set()
+        for kind, (expires, stacks) in self.active_powers.items():
+            effect = POWER_EFFECTS[kind]
+            for name, factor in effect.get('modifiers', {}).items():
+                modifiers[name] *= factor ** stacks
+            flags.update(effect.get('flags', ()))
+        self.modifiers = modifiers
+        self.paddle.width = min(PADDLE_MAX_WIDTH, int(PADDLE_WIDTH * modifiers['paddle_width']))
+        self.ball_speed = modifiers['ball_speed']
+        self.sticky = 'sticky' in flags
+        self.is_reversed = 'reversed' in flags
+
+    def power_remaining(self, kind):
+        # seconds left on an active power
+        return max(0.0, (self.active_powers[kind][0] - self.time) / FPS)
+
+    def split_balls(self):
+        # every ball spawns two free copies heading left and right
+        pool = self.balls
+        n = pool.n
+        x = pool.x[:n]
+        y = pool.y[:n]
+        vy = pool.vy[:n]
+        vx = np.where(pool.vx[:n] != 0, pool.vx[:n], BASE_SPEED)
+        pool.spawn_many(np.concatenate((x, x)), np.concatenate((y, y)),
+                        np.concatenate((vx, -vx)), np.concatenate((vy, vy)))
+
+    def add_life(self):
+        self.lives += 1
+
+    def hit_brick(self, brick):
+        brick.hits -= 1
+        self.bricks.touch(brick)
+        if brick.hits <= 0:
+            if brick.kind == 'bomb':
+                score_ref = [self.score]
+                destroyed = explode_brick(brick, self.bricks, score_ref)
+                self.score = score_ref[0]
+                self.events.append('explosion')
+            else:
+                self.score += 10
+                try:
+                    self.bricks.remove(brick)
+                except ValueError:
+                    pass
+                self.spawn_power(*brick.center)
+        else:
+            self.events.append('pop')
+
+    def sweep_ball(self, i, h):
+        # move ball i by v*h, stopping at each wall/brick contact at the exact
+        # time of impact, reflecting about the contact normal and continuing
+        pool = self.balls
+        x = pool.x.item(i)
+        y = pool.y.item(i)
+        vx = pool.vx.item(i)
+        vy = pool.vy.item(i)
+        r = pool.radius.item(i)
+        bricks = self.bricks
+        remaining = 1.0
+        for _ in range(MAX_BOUNCES):
+            dx = vx * h * remaining
+            dy = vy * h * remaining
+            if dx == 0 and dy == 0:
+                break
+            best = None
+            # live cells under the swept box, tested in place: no box Rect,
+            # no Brick views and no query list unless something is hit
+            left = int(min(x, x+dx) - r) - 1
+            top = int(min(y, y+dy) - r) - 1
+            cells = bricks.cells(left, top, left + int(abs(dx)) + r*2 + 3, top + int(abs(dy)) + r*2 + 3)
+            if cells is not None:
+                r0, r1, c0, c1 = cells
+                alive = bricks.alive
+                for row in range(r0, r1 + 1):
+                    by = BRICK_START_Y + row * BRICK_HEIGHT
+                    for col in range(c0, c1 + 1):
+                        if not alive.item(row, col):
+                            continue
+                        bx = BRICK_AREA_MARGIN + col * BRICK_WIDTH
+                        hit = sweep_circle_rect(x, y, dx, dy, r, bx, by, bx + BRICK_WIDTH-6, by + BRICK_HEIGHT-6)
+                        if hit is not None and (best is None or hit[0] < best[0]):
+                            best = (hit[0], hit[1], hit[2], row, col)
+            # walls are planes at one radius from the left, right and top edges
+            if dx < 0 and x + dx < r:
+                t = max(0.0, (r - x) / dx)
+                if best is None or t < best[0]:
+                    best = (t, 1.0, 0.0, None, None)
+            if dx > 0 and x + dx > SCREEN_WIDTH - r:
+                t = max(0.0, (SCREEN_WIDTH - r - x) / dx)
+                if best is None or t < best[0]:
+                    best = (t, -1.0, 0.0, None, None)
+            if dy < 0 and y + dy < r:
+                t = max(0.0, (r - y) / dy)
+                if best is None or t < best[0]:
+                    best = (t, 0.0, 1.0, None, None)
+            if best is None:
+                x += dx
+                y += dy
+                break
+            t, nx, ny, row, col = best
+            x += dx * t
+            y += dy * t
+            dot = vx*nx + vy*ny
+            if dot < 0:
+                vx -= 2 * dot * nx
+                vy -= 2 * dot * ny
+            if row is not None:
+                self.hit_brick(bricks.get(row, col))
+            remaining *= (1 - t)
+        pool.x[i] = x
+        pool.y[i] = y
+        pool.vx[i] = vx
+        pool.vy[i] = vy
+
+    def bounce_off_paddle(self, i):
+        pool = self.balls
+        paddle = self.paddle
+        if self.sticky:
+            pool.stuck[i] = True
+            pool.vx[i] = 0
+            pool.vy[i] = 0
+        else:
+            pool.y[i] = paddle.y - pool.radius[i] - 1
+            pool.vy[i] = -pool.vy[i]
+            offset = (pool.x[i] - (paddle.x + paddle.width/2)) / (paddle.width/2)
+            pool.vx[i] += offset * 3
+        self.events.append('beep')
+
+    def handle_collisions(self, h):
+        # advance every ball by h with swept wall/brick collision, then test the paddle
+        pool = self.balls
+        n = pool.n
+        if n >= VECTOR_MIN_BALLS:
+            self.handle_collisions_vectorized(h)
+            return
+        paddle = self.paddle
+        px, py, pw, ph = paddle.rect()
+        # per-ball reads go through .item(), which returns plain Python
+        # numbers instead of allocating NumPy scalars
+        for i in range(n):
+            if pool.stuck.item(i):
+                pool.x[i] = paddle.x + paddle.width//2
+                pool.y[i] = paddle.y - pool.radius.item(i) - 2
+                continue
+            self.sweep_ball(i, h)
+            if pool.vy.item(i) > 0:
+                # the ball's integer box against the paddle, as Rect.colliderect
+                r = pool.radius.item(i)
+                left = int(pool.x.item(i) - r)
+                top = int(pool.y.item(i) - r)
+                if left < px + pw and left + 2*r > px and top < py + ph and top + 2*r > py:
+                    self.bounce_off_paddle(i)
+
+    def handle_collisions_vectorized(self, h):
+        # Same as handle_collisions for many balls at once. Balls whose step
+        # stays below the lowest brick fly free with vectorized wall
+        # reflection; the rest get an exact per-ball sweep against the grid.
+        pool = self.balls
+        n = pool.n
+        paddle = self.paddle
+        x = pool.x[:n]
+        y = pool.y[:n]
+        vx = pool.vx[:n]
+        vy = pool.vy[:n]
+        r = pool.radius[:n]
+        stuck = pool.stuck[:n]
+        x[stuck] = paddle.x + paddle.width//2
+        y[stuck] = paddle.y - r[stuck] - 2
+
+        dy = vy * h
+        if self.bricks:
+            near = ~stuck & (np.minimum(y, y + dy) - r <= self.bricks.bottom + 1)
+        else:
+            near = np.zeros(n, dtype=bool)
+        free = ~stuck & ~near
+        if free.any():
+            fx = x[free] + vx[free] * h
+            fy = y[free] + dy[free]
+            fvx = vx[free]
+            fvy = vy[free]
+            fr = r[free]
+            m = fx < fr
+            fx[m] = 2*fr[m] - fx[m]
+            fvx[m] = -fvx[m]
+            m = fx > SCREEN_WIDTH - fr
+            fx[m] = 2*(SCREEN_WIDTH - fr[m]) - fx[m]
+            fvx[m] = -fvx[m]
+            m = fy < fr
+            fy[m] = 2*fr[m] - fy[m]
+            fvy[m] = -fvy[m]
+            x[free] = fx
+            y[free] = fy
+            vx[free] = fvx
+            vy[free] = fvy
+        for i in np.flatnonzero(near).tolist():
+            self.sweep_ball(i, h)
+
+        # paddle: same integer-rect overlap test as pygame.Rect.colliderect
+        left = np.floor(x - r)
+        top = np.floor(y - r)
+        hit = (~stuck & (vy > 0) & (left < paddle.x + paddle.width) & (left + 2*r > paddle.x)
+               & (top < paddle.y + paddle.height) & (top + 2*r > paddle.y))
+        k = int(np.count_nonzero(hit))
+        if not k:
+            return
+        if self.sticky:
+            stuck[hit] = True
+            vx[hit] = 0
+            vy[hit] = 0
+        else:
+            y[hit] = paddle.y - r[hit] - 1
+            vy[hit] = -vy[hit]
+            offset = (x[hit] - (paddle.x + paddle.width/2)) / (paddle.width/2)
+            vx[hit] += offset * 3
+        self.events.extend(['beep'] * k)
+
+    def update_powerups(self, dt):
+        # falls dt + 1 per tick; caught or missed power-ups are swap-removed
+        # (the last one takes their slot) and go back to spare_powerups
+        powerups = self.powerups
+        i = 0
+        while i < len(powerups):
+            p = powerups[i]
+            p.update(dt)
+            p.update(1)
+            caught = p.rect.colliderect(self.paddle.rect())  # EXPAND may have resized it
+            if caught:
+                self.apply_power(p.kind)
+            if caught or p.y >= SCREEN_HEIGHT+50:
+                powerups[i] = powerups[-1]
+                powerups.pop()
+                self.spare_powerups.append(p)
+            else:
+                i += 1
+
+    def advance(self, frame_dt, left=False, right=False, launch=False):
+        # fixed-timestep accumulator: render frames of any length are turned
+        # into whole SIM_DT ticks, so results don't depend on the frame rate
+        if launch:
+            self.pending_launch = True
+        self.accumulator += frame_dt
+        ticks = 0
+        while self.accumulator >= SIM_DT and self.state == 'playing':
+            if ticks == MAX_TICKS_PER_FRAME:
+                self.accumulator = 0.0
+                break
+            self.step(SIM_DT, left, right)
+            self.accumulator -= SIM_DT
+            ticks += 1
+        return ticks
+
+    def step(self, dt, left=False, right=False, launch=False):
+        # input is passed in: held left/right plus a one-shot launch
+        if self.pending_launch:
+            self.pending_launch = False
+            launch = True
+        if self.log is not None:
+            self.log.tick(left, right, launch)
+        if launch:
+            self.launch()
+        if self.is_reversed:
+            left, right = right, left
+        if left:
+            self.paddle.move(-1)
+        if right:
+            self.paddle.move(1)
+
+        h = dt * self.ball_speed / SUBSTEPS
+        if self.timing:
+            start = time.perf_counter()
+        for _ in range(SUBSTEPS):
+            self.handle_collisions(h)
+        if self.timing:
+            self.collision_time += time.perf_counter() - start
+        pool = self.balls
+        pool.push_trail()
+        n = pool.n
+        pool.remove(pool.y[:n] - pool.radius[:n] > SCREEN_HEIGHT)
+        if len(self.balls) == 0:
+            self.lives -= 1
+            if self.lives <= 0:
+                self.state = 'game_over'
+                return
+            else:
+                self.balls.spawn(self.paddle.x + self.paddle.width//2, self.paddle.y - BALL_RADIUS - 2)
+        self.time += dt
+        self.expire_powers()
+        self.update_powerups(dt)
+        if not self.bricks and self.state == 'playing':
+            if self.level < MAX_LEVEL:
+                self.state = 'cleared'
+                if self.level > self.best_level:
+                    self.best_level = self.level
+            else:
+                self.state = 'max_level'
+
+class InputLog:
+    # compact lockstep input recording: one byte of key state per tick
+    def __init__(self, seed, data=b''):
+        self.seed = seed
+        self.data = bytearray(data)
+
+    def tick(self, left, right, launch):
+        self.data.append((INPUT_LEFT if left else 0) | (INPUT_RIGHT if right else 0) | (INPUT_LAUNCH if launch else 0))
+
+    def command(self, cmd):
+        self.data.append(REPLAY_COMMAND | cmd)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(struct.pack(REPLAY_HEADER, REPLAY_MAGIC, REPLAY_VERSION, self.seed))
+            f.write(self.data)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        header = struct.calcsize(REPLAY_HEADER)
+        magic, version, seed = struct.unpack_from(REPLAY_HEADER, raw)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f'{path} is not a version {REPLAY_VERSION} replay')
+        return cls(seed, raw[header:])
+
+def replay(log):
+    # re-run a recorded session headless, as fast as the CPU allows
+    sim = Simulation(log.seed)
+    for byte in log.data:
+        if byte & REPLAY_COMMAND:
+            sim.command(byte & ~REPLAY_COMMAND)
+        else:
+            sim.step(SIM_DT, bool(byte & INPUT_LEFT), bool(byte & INPUT_RIGHT), bool(byte & INPUT_LAUNCH))
+            sim.events.clear()
+    return sim
+
+# --------- Dirty-rect renderer ---------
+HUD_RECTS = (pygame.Rect(10,10,260,92), pygame.Rect(0,12,SCREEN_WIDTH,28))
+
+class DirtyRenderer:
+    # Keeps the sky (gradient + sun/moon at the quantized time of day) and the
+    # bricks in a cached layer. Each frame only the regions under the previous
+    # and current paddle/balls/powerups/HUD are restored, redrawn and pushed
+    # with pygame.display.update(rects). Hit or removed bricks are patched into
+    # the layer cell by cell; static popup states are not redrawn at all.
+    def __init__(self, game):
+        self.game = game
+        self.background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.layer_key = None
+        self.last_state = None
+        self.prev_rects = []
+        # actor rects alternate between two sets of owned Rects: the paddle
+        # and power-ups move their Rects in place, so prev_rects must not
+        # alias them, and this frame must not overwrite last frame's set
+        self.rect_lists = ([], [])
+        self.rect_pools = ([], [])
+        self.front = 0
+
+    def invalidate(self):
+        self.last_state = None
+
+    def rebuild_layer(self, key):
+        game = self.game
+        sky_key, bricks = key
+        game.draw_sky(self.background, sky_key / game.sky.steps)
+        self.layer.blit(self.background, (0,0))
+        bricks.track_changes()
+        bricks.changed.clear()
+        bricks.draw(self.layer)
+        self.layer_key = key
+
+    def patch_bricks(self, bricks):
+        rects = []
+        for brick in bricks.changed:
+            self.layer.blit(self.background, brick.rect, brick.rect)
+            if brick in bricks:
+                brick.draw(self.layer)
+            rects.append(brick.rect)
+        bricks.changed.clear()
+        return rects
+
+    def actor_rects(self):
+        sim = self.game.sim
+        self.front ^= 1
+        rects = self.rect_lists[self.front]
+        pool = self.rect_pools[self.front]
+        need = 1 + len(sim.balls) + len(sim.powerups)
+        while len(pool) < need:
+            pool.append(pygame.Rect(0, 0, 0, 0))
+        rects.clear()
+        pool[0].update(sim.paddle.rect())
+        rects.append(pool[0])
+        k = 1
+        for b in sim.balls:
+            rects.append(b.dirty_rect(pool[k]))
+            k += 1
+        for p in sim.powerups:
+            pool[k].update(p.rect)
+            rects.append(pool[k])
+            k += 1
+        rects.extend(HUD_RECTS)
+        return rects
+
+    def render(self):
+        game = self.game
+        screen = game.screen
+        state = game.state
+        prof = game.prof
+        if game.states[state].static and state == self.last_state:
+            return
+        key = (game.sky.key(game.time_of_day), game.sim.bricks)
+        full = key != self.layer_key or state != 'playing' or self.last_state != 'playing'
+        if key != self.layer_key:
+            self.rebuild_layer(key)
+        changed = self.patch_bricks(game.sim.bricks)
+        if full:
+            screen.blit(self.layer, (0,0))
+        else:
+            for r in self.prev_rects:
+                screen.blit(self.layer, r, r)
+            for r in changed:
+                screen.blit(self.layer, r, r)
+        if prof: prof.lap('background')
+        game.draw_actors()
+        if prof: prof.lap('actors')
+        game.draw_hud()
+        if prof: prof.lap('hud')
+        game.draw_overlay()
+        if prof: prof.lap('overlay')
+        rects = self.actor_rects()
+        if game.profiler.visible:
+            rects.append(game.profiler.draw(screen))
+            if prof: prof.lap('profiler')
+        if full or len(rects) + len(self.prev_rects) + len(changed) > DIRTY_RECT_LIMIT:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.prev_rects + rects + changed)
+        if prof: prof.lap('flip')
+        self.prev_rects = rects
+        self.last_state = state
+
+# --------- Startup profiling ---------
+class StartupProfile:
+    # wall-clock phases from process start to the first presented frame;
+    # phases on other threads are recorded with their own start offset
+    def __init__(self, origin=STARTED):
+        self.origin = origin
+        self.last = origin
+        self.phases = []
+        self.background = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def mark_background(self, name, start):
+        now = time.perf_counter()
+        self.background.append((name, start - self.origin, now - start))
+
+    def report(self):
+        lines = ['startup phase                ms']
+        for name, seconds in self.phases:
+            lines.append(f'  {name:<24} {seconds * 1000:7.1f}')
+        lines.append(f'  {"time to first frame":<24} {(self.last - self.origin) * 1000:7.1f}')
+        for name, offset, seconds in self.background:
+            lines.append(f'  {name + " (bg)":<24} {seconds * 1000:7.1f}  '
+                         f'started at {offset * 1000:.1f}, ready at {(offset + seconds) * 1000:.1f}')
+        return '\n'.join(lines)
+
+# --------- Frame profiler ---------
+class GCCounter:
+    # GC pressure: collections per generation, counted through gc.callbacks,
+    # and the net number of memory blocks allocated between sample() calls.
+    # Neither sees objects made and freed in between, so with `allocations`
+    # tracemalloc also reports the peak bytes held above the level at the
+    # previous sample: short-lived Rects, lists and views show up there.
+    # tracemalloc slows everything down; leave it off when timing.
+    def __init__(self, allocations=False):
+        self.collections = [0, 0, 0]
+        self.seen = 0
+        self.blocks = sys.getallocatedblocks()
+        self.tracemalloc = None
+        if allocations:
+            import tracemalloc
+            self.tracemalloc = tracemalloc
+            self.owns_trace = not tracemalloc.is_tracing()
+            if self.owns_trace:
+                tracemalloc.start()
+            self.traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        gc.callbacks.append(self.callback)
+
+    def callback(self, phase, info):
+        if phase == 'start':
+            self.collections[info['generation']] += 1
+
+    def sample(self):
+        # (collections, net blocks, peak transient bytes or None) since the
+        # previous sample
+        total = sum(self.collections)
+        blocks = sys.getallocatedblocks()
+        transient = None
+        if self.tracemalloc is not None:
+            current, peak = self.tracemalloc.get_traced_memory()
+            transient = peak - self.traced
+            self.traced = current
+            self.tracemalloc.reset_peak()
+        result = (total - self.seen, blocks - self.blocks, transient)
+        self.seen = total
+        self.blocks = blocks
+        return result
+
+    def close(self):
+        gc.callbacks.remove(self.callback)
+        if self.tracemalloc is not None and self.owns_trace:
+            self.tracemalloc.stop()
+
+class FrameProfiler:
+    # Lap timer over PROFILE_PHASES. Game only calls into it while it is
+    # active (overlay shown or a trace being recorded), so when off the cost
+    # is one attribute test per instrumented point. The last PROFILE_HISTORY
+    # frames live in a NumPy ring for the overlay; traces keep every frame.
+    # Each frame also records GC collections and net allocated blocks.
+    def __init__(self, history=PROFILE_HISTORY, trace_path=None):
+        self.index = {name: i for i, name in enumerate(PROFILE_PHASES)}
+        self.frame = len(PROFILE_PHASES)
+        # columns: phases, whole frame, gc collections, net allocated blocks
+        self.ring = np.zeros((history, len(PROFILE_PHASES) + 3))
+        self.count = 0
+        self.gc = None
+        self.visible = False
+        self.trace_path = trace_path
+        self.trace = [] if trace_path else None
+        self.table = None
+        self.panel = None
+
+    @property
+    def active(self):
+        return self.visible or self.trace is not None
+
+    def begin(self):
+        if self.gc is None:
+            self.gc = GCCounter()
+        self.start = self.last = time.perf_counter()
+        self.current = [0.0] * len(PROFILE_PHASES)
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.current[self.index[phase]] += now - self.last
+        self.last = now
+
+    def split(self, phase, seconds, parent):
+        # move time measured inside another phase (e.g. collisions in update)
+        self.current[self.index[phase]] += seconds
+        self.current[self.index[parent]] -= seconds
+
+    def end(self):
+        row = self.current
+        row.append(time.perf_counter() - self.start)
+        collections, blocks, _ = self.gc.sample()
+        row.append(collections)
+        row.append(blocks)
+        self.ring[self.count % len(self.ring)] = row
+        self.count += 1
+        if self.trace is not None:
+            self.trace.append(row)
+
+    def stats(self):
+        # (p50, p99) in ms per phase plus the whole frame, over the ring
+        frames = self.ring[:max(1, min(self.count, len(self.ring))), :self.frame + 1] * 1000
+        return np.percentile(frames, 50, axis=0), np.percentile(frames, 99, axis=0)
+
+    def draw(self, surf):
+        # top-right panel: p50/p99 table (refreshed every PROFILE_REFRESH
+        # frames) over a frame-time graph with the 60 FPS budget marked
+        if self.table is None or self.count % PROFILE_REFRESH == 0:
+            font = get_font(None, 18)
+            p50, p99 = self.stats()
+            rows = [('phase', 'p50', 'p99')] + [
+                (name, f'{a:.2f}', f'{b:.2f}')
+                for name, a, b in zip(PROFILE_PHASES + ('frame',), p50, p99)]
+            n = max(1, min(self.count, len(self.ring)))
+            collections, blocks = self.ring[:n, self.frame + 1:].sum(axis=0)
+            rows.append(('gc / blocks', f'{collections:.0f}', f'{blocks / n:+.1f}'))
+            self.table = pygame.Surface((220, 16 * len(rows) + 6), pygame.SRCALPHA)
+            for i, (name, a, b) in enumerate(rows):
+                for x, text in ((6, name), (120, a), (170, b)):
+                    self.table.blit(font.render(text, True, (220,230,240)), (x, 4 + 16 * i))
+        if self.panel is None:
+            self.panel = pygame.Surface((220, self.table.get_height() + 70), pygame.SRCALPHA)
+        panel = self.panel
+        panel.fill((10,12,20,200))
+        panel.blit(self.table, (0, 0))
+        gy, gh = self.table.get_height() + 4, 60
+        budget = 1000 / FPS
+        scale = gh / (2 * budget)
+        pygame.draw.line(panel, (90,90,120), (0, gy + gh - budget * scale), (219, gy + gh - budget * scale))
+        n = min(self.count, len(self.ring))
+        if n > 1:
+            order = (np.arange(n) + self.count - n) % len(self.ring)
+            ms = np.minimum(self.ring[order, self.frame] * 1000, 2 * budget)
+            xs = np.linspace(0, 219, n)
+            ys = gy + gh - ms * scale
+            pygame.draw.lines(panel, (120,230,140), False, list(zip(xs.tolist(), ys.tolist())))
+        rect = panel.get_rect(topright=(SCREEN_WIDTH - 8, 8))
+        surf.blit(panel, rect)
+        return rect
+
+    def save(self, path=None):
+        # CSV or JSON by extension; times in milliseconds, one row per frame,
+        # followed by that frame's gc collections and net allocated blocks
+        import json
+        path = path or self.trace_path
+        columns = PROFILE_PHASES + ('frame', 'gc', 'blocks')
+        rows = [[round(v * 1000, 4) for v in row[:self.frame + 1]] + row[self.frame + 1:] for row in self.trace or ()]
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump({'unit': 'ms', 'columns': columns, 'frames': rows}, f)
+        else:
+            with open(path, 'w') as f:
+                f.write(','.join(columns) + '\n')
+                for row in rows:
+                    f.write(','.join(map(str, row)) + '\n')
+
 # --------- Game Class (main) ---------
 class Game:
-    def __init__(self):
-        pygame.init()
-        pygame.mixer.init(frequency=22050)
+    def __init__(self, dirty_rects=DIRTY_RECTS, seed=None, record=None, profile=None, trace=None):
+        self.profile = profile
+        mark = profile.mark if profile else lambda name: None
+        mark('imports')
+        # only the subsystems we use; pygame.init() would also bring up
+        # joystick/camera/etc. and open the audio device on this thread
+        pygame.display.init()
+        pygame.font.init()
+        clear_render_caches()
+        scan_fonts_async()
+        mark('pygame init')
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption('Brick Breaker — Visual Upgrade (1024x768)')
         self.clock = pygame.time.Clock()
         self.running = True
+        mark('display')
 
-        # sounds
-        self.sound_on = True
-        self.sfx_beep = make_beep(880, 70, 0.4)
-        self.sfx_pop = make_beep(650, 60, 0.35)
-        self.sfx_power = make_beep(1000, 90, 0.45)
-        self.sfx_ex1 = make_beep(200, 120, 0.6)
-        self.sfx_ex2 = make_beep(420, 160, 0.5)
+        # the audio device and tone synthesis come up in the background; cues
+        # raised before they are ready are dropped
+        self.sound = SoundManager()
+        threading.Thread(target=self.init_audio, name='audio-init', daemon=True).start()
 
-        # background particles (stars)
-        self.stars = [{'x': random.randint(0,SCREEN_WIDTH), 'y': random.randint(0,SCREEN_HEIGHT), 'r': random.choice([1,2,2])} for _ in range(100)]
+        if seed is None:
+            seed = random.SystemRandom().randrange(2**63)
+        self.seed = seed
+        self.rng = random.Random(seed)  # visual-only randomness (weather)
+
+        # background particles (stars, clouds, rain)
+        self.particles = WeatherParticles(seed=seed)
+        mark('particles')
 
         # day/night + weather state
         self.time_of_day = 0.0  # 0..1 loop (0 morning, 0.5 night)
         self.cycle_speed = 1/ (45 * FPS)  # full cycle ~45 seconds
         self.weather = 'clear'  # clear, clouds, rain
-        self.weather_timer = random.randint(8*FPS, 18*FPS)
-        self.clouds = []  # list of cloud dicts
-        self.rain = []    # list of raindrops
+        self.weather_timer = self.rng.randint(8*FPS, 18*FPS)
         self.lightning_timer = 0
+        self.flash = None
+        self.sun_glow = None
+        self.moon_glow = None
+        self.sky = SkyCache()
 
         # state
         self.state = 'menu'
-        self.level = 1
-        self.best_level = 1
-        self.lives = 3
-        self.score = 0
-        self.active_powers = {}
-        self.is_reversed = False
-
-        self.font = pygame.font.SysFont(None, 20)
+        self.sim = Simulation(seed)
+        self.record_path = record
+        if record:
+            self.sim.start_recording()
+        self.launch_requested = False
+
+        self.font = get_font(None, 20)
+        self.hud_panel = None
         self.menu_buttons = []
         self.settings_buttons = []
         self.popup_buttons = []
-
-        self.reset_level(first=True)
+        self.popup_cache = {}
+        self.popup_overlay = None
+        self.instr_back = None
+        self.renderer = DirtyRenderer(self) if dirty_rects else None
+        self.handlers = {(pygame.QUIT, None): self.quit,
+                         (pygame.KEYDOWN, pygame.K_F3): self.toggle_profiler}
+        # the window contents can be lost while a static screen is held
+        for event_type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED,
+                           pygame.WINDOWSHOWN, pygame.WINDOWRESTORED):
+            self.handlers[(event_type, None)] = self.redraw
+        self.states = {}
+        self.presented = None       # state shown by the last full redraw
+        self.add_states()
+        self.profiler = FrameProfiler(trace_path=trace)
+        self.prof = None  # the profiler while it is active this frame, else None
+
+        self.show_level_popup = False
+        self.popup_message = f'Level {self.sim.level}'
+        mark('game state')
+
+    def init_audio(self):
+        start = time.perf_counter()
+        try:
+            pygame.mixer.init(frequency=22050)
+        except pygame.error:
+            return
+        # both explosion partials in one Sound, with a short fade-out
+        self.sound.load({
+            'beep': make_beep(880, 70, 0.4),
+            'pop': make_beep(650, 60, 0.35),
+            'power': make_beep(1000, 90, 0.45),
+            'explosion': make_sound(((200, 120, 0.6), (420, 160, 0.5)), (0, 40)),
+        })
+        if self.profile:
+            self.profile.mark_background('audio', start)
 
     def reset_level(self, first=False):
-        self.paddle = Paddle()
-        self.balls = [Ball(self.paddle.x + self.paddle.width//2, self.paddle.y - BALL_RADIUS - 2)]
-        for b in self.balls:
-            b.stuck = True
-        rows = BRICK_ROWS_BASE + (self.level // 3)
-        self.bricks = create_bricks(rows)
-        self.powerups = []
+        self.sim.command(CMD_RESET)
         self.show_level_popup = not first
-        self.popup_message = f'Level {self.level}'
+        self.popup_message = f'Level {self.sim.level}'
+
+    def change_level(self, cmd):
+        self.sim.command(cmd)
+        self.show_level_popup = True
+        self.popup_message = f'Level {self.sim.level}'
+        self.state = 'playing'
 
     def restart_game(self):
-        self.level = 1
-        self.score = 0
-        self.lives = 3
-        self.active_powers.clear()
-        self.is_reversed = False
-        self.reset_level(first=True)
+        self.sim.command(CMD_RESTART)
         self.state = 'playing'
 
-    def spawn_power(self, x, y):
-        if random.random() < POWERUP_CHANCE:
-            self.powerups.append(PowerUp(x-12, y-12, random.choice(POWER_TYPES)))
+    def start_game(self):
+        self.state = 'playing'
+        self.reset_level(first=True)
 
-    def apply_power(self, kind):
-        if kind == 'REVERSE':
-            self.active_powers[kind] = REVERSE_DURATION
-            self.is_reversed = True
-        else:
-            self.active_powers[kind] = POWER_DURATION
-        if kind == 'EXPAND':
-            self.paddle.width = min(400, int(self.paddle.width * 1.5))
-        elif kind == 'MULTI':
-            new_balls = []
-            existing = list(self.balls)
-            for b in existing:
-                nb1 = Ball(b.x, b.y, (b.vx if b.vx!=0 else BASE_SPEED), b.vy)
-                nb2 = Ball(b.x, b.y, -(b.vx if b.vx!=0 else BASE_SPEED), b.vy)
-                nb1.stuck = False
-                nb2.stuck = False
-                new_balls.extend([nb1, nb2])
-            self.balls.extend(new_balls)
-        elif kind == 'SLOW':
-            for b in self.balls:
-                b.vx *= 0.6
-                b.vy *= 0.6
-        elif kind == 'LIFE':
-            self.lives += 1
-        elif kind == 'STICKY':
-            self.active_powers[kind] = POWER_DURATION
-        if self.sound_on and self.sfx_power:
-            self.sfx_power.play()
-
-    def remove_power(self, kind):
-        if kind == 'EXPAND':
-            self.paddle.width = PADDLE_WIDTH
-        if kind == 'SLOW':
-            for b in self.balls:
-                b.vx *= (1/0.6)
-                b.vy *= (1/0.6)
-        if kind == 'REVERSE':
-            self.is_reversed = False
-        if kind in self.active_powers:
-            del self.active_powers[kind]
-
-    def handle_collisions(self):
-        for b in list(self.balls):
-            if b.stuck:
-                b.x = self.paddle.x + self.paddle.width//2
-                b.y = self.paddle.y - b.radius - 2
-            if b.rect().colliderect(self.paddle.rect()) and not b.stuck:
-                if 'STICKY' in self.active_powers:
-                    b.stuck = True
-                    b.vx = 0
-                    b.vy = 0
-                else:
-                    b.y = self.paddle.y - b.radius - 1
-                    b.vy *= -1
-                    offset = (b.x - (self.paddle.x + self.paddle.width/2)) / (self.paddle.width/2)
-                    b.vx += offset * 3
-                if self.sound_on and self.sfx_beep:
-                    self.sfx_beep.play()
-            for brick in list(self.bricks):
-                if b.rect().colliderect(brick.rect):
-                    overlap = b.rect().clip(brick.rect)
-                    if overlap.width < overlap.height:
-                        b.vx *= -1
-                    else:
-                        b.vy *= -1
-                    brick.hits -= 1
-                    if brick.hits <= 0:
-                        if brick.kind == 'bomb':
-                            destroyed = explode_brick(brick, self.bricks, [self.score])
-                            if self.sound_on:
-                                play_explosion([self.sfx_ex1, self.sfx_ex2])
-                        else:
-                            self.score += 10
-                            try:
-                                self.bricks.remove(brick)
-                            except ValueError:
-                                pass
-                            self.spawn_power(brick.rect.centerx, brick.rect.centery)
-                    else:
-                        if self.sound_on and self.sfx_pop:
-                            self.sfx_pop.play()
-                    break
-        for p in list(self.powerups):
-            p.update(1)
-            if p.rect.colliderect(self.paddle.rect()):
-                self.apply_power(p.kind)
-                try:
-                    self.powerups.remove(p)
-                except ValueError:
-                    pass
-        self.powerups = [p for p in self.powerups if p.y < SCREEN_HEIGHT+50]
+    def next_level(self):
+        if self.sim.level < MAX_LEVEL:
+            self.change_level(CMD_NEXT)
+
+    def request_launch(self):
+        self.launch_requested = True
+
+    def toggle_sound(self):
+        self.sound.enabled = not self.sound.enabled
+        if not self.sound.enabled:
+            self.sound.stop()
+
+    def redraw(self):
+        # repaint the whole screen next frame, static or not
+        self.presented = None
+        if self.renderer is not None:
+            self.renderer.invalidate()
+
+    def toggle_profiler(self):
+        self.profiler.visible = not self.profiler.visible
+        self.redraw()
+
+    def quit(self):
+        self.running = False
+
+    def go(self, state):
+        # a handler that switches to `state`
+        return lambda: setattr(self, 'state', state)
+
+    def add_state(self, state):
+        self.states[state.name] = state
+
+    def add_states(self):
+        KEY, CLICK = pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN
+        view = self.draw_game_view
+        self.add_state(State('menu', self.draw_menu, buttons=lambda: self.menu_buttons, handlers={
+            (KEY, pygame.K_RETURN): self.start_game, (KEY, pygame.K_i): self.go('instructions'),
+            (KEY, pygame.K_s): self.go('settings'),
+            (CLICK, 'Start'): self.start_game, (CLICK, 'Instructions'): self.go('instructions'),
+            (CLICK, 'Settings'): self.go('settings'), (CLICK, 'Exit'): self.quit}))
+        self.add_state(State('settings', self.draw_settings, buttons=lambda: self.settings_buttons, handlers={
+            (KEY, pygame.K_ESCAPE): self.go('menu'),
+            (CLICK, 'Sound'): self.toggle_sound, (CLICK, 'Back'): self.go('menu')}))
+        self.add_state(State('instructions', self.draw_instructions,
+                             buttons=lambda: (self.instr_back,) if self.instr_back else (), handlers={
+            (KEY, pygame.K_ESCAPE): self.go('menu'), (CLICK, 'Back'): self.go('menu')}))
+        self.add_state(State('playing', view, update=self.update, game_view=True, handlers={
+            (KEY, pygame.K_SPACE): self.request_launch, (KEY, pygame.K_RETURN): self.request_launch,
+            (KEY, pygame.K_p): self.go('paused')}))
+        # popups: the overlay draws their buttons, which then take the clicks
+        popup = lambda: self.popup_buttons
+        self.add_state(State('paused', view, game_view=True, static=True,
+                             overlay=lambda: self.draw_popup('Paused', ('Resume','Exit')), handlers={
+            (KEY, pygame.K_p): self.go('playing'), (CLICK, None): self.go('playing')}))
+        self.add_state(State('level_popup', view, buttons=popup, game_view=True, static=True,
+                             overlay=lambda: self.draw_popup(self.popup_message, ('Previous','Next','Exit')), handlers={
+            (KEY, pygame.K_n): self.next_level,
+            (CLICK, 'Next'): lambda: self.change_level(CMD_NEXT),
+            (CLICK, 'Previous'): lambda: self.change_level(CMD_PREVIOUS), (CLICK, 'Exit'): self.quit}))
+        self.add_state(State('max_popup', view, buttons=popup, game_view=True, static=True,
+                             overlay=self.draw_max_popup, handlers={
+            (KEY, pygame.K_r): self.restart_game,
+            (CLICK, 'Restart Game'): self.restart_game, (CLICK, 'Exit'): self.quit}))
+        self.add_state(State('game_over', view, buttons=popup, game_view=True, static=True,
+                             overlay=lambda: self.draw_popup('Game Over', ('Play Again','Exit')), handlers={
+            (KEY, pygame.K_r): self.restart_game,
+            (CLICK, 'Play Again'): self.restart_game, (CLICK, 'Exit'): self.quit}))
+
+    def dispatch(self, event):
+        # global handlers (quit, profiler, window expose) first, then the current state's
+        handler = self.handlers.get((event.type, getattr(event, 'key', None)))
+        if handler is None:
+            handler = self.states[self.state].handler(event)
+        if handler is not None:
+            handler()
 
     def update(self, dt):
         # advance time-of-day and weather timers (visual only)
@@ -430,207 +2050,124 @@ class Game:
         # weather timer counts down; when zero, randomize weather and reset timer
         self.weather_timer -= 1
         if self.weather_timer <= 0:
-            self.weather = random.choices(['clear','clouds','rain'], weights=[0.6,0.3,0.1])[0]
-            self.weather_timer = random.randint(8*FPS, 20*FPS)
-            # spawn some clouds if needed
-            self.clouds = []
-            if self.weather in ('clouds','rain'):
-                for i in range(random.randint(3,7)):
-                    self.clouds.append({'x': random.randint(-200, SCREEN_WIDTH), 'y': random.randint(20, 160), 'w': random.randint(160,320), 'speed': random.uniform(0.12,0.4)})
-            # start rain drops if rain
-            self.rain = []
-            if self.weather == 'rain':
-                for i in range(160):
-                    self.rain.append({'x': random.randint(0, SCREEN_WIDTH), 'y': random.randint(-SCREEN_HEIGHT, SCREEN_HEIGHT), 'len': random.randint(8,18), 'speed': random.uniform(2.0,4.0)})
+            self.weather = self.rng.choices(['clear','clouds','rain'], weights=[0.6,0.3,0.1])[0]
+            self.weather_timer = self.rng.randint(8*FPS, 20*FPS)
+            # respawn clouds and rain drops for the new weather
+            self.particles.set_weather(self.weather)
             # lightning chance
-            if self.weather == 'rain' and random.random() < 0.25:
-                self.lightning_timer = random.randint(2, 6)
+            if self.weather == 'rain' and self.rng.random() < 0.25:
+                self.lightning_timer = self.rng.randint(2, 6)
 
         # lightning countdown (short flashes)
         if self.lightning_timer > 0:
             self.lightning_timer -= 1
-            if self.lightning_timer == 0 and random.random() < 0.35:
-                self.lightning_timer = random.randint(2,6)
+            if self.lightning_timer == 0 and self.rng.random() < 0.35:
+                self.lightning_timer = self.rng.randint(2,6)
 
         # input
         keys = pygame.key.get_pressed()
-        left_pressed = keys[pygame.K_LEFT]
-        right_pressed = keys[pygame.K_RIGHT]
-        if self.is_reversed:
-            left_pressed, right_pressed = right_pressed, left_pressed
-        if left_pressed:
-            self.paddle.move(-1)
-        if right_pressed:
-            self.paddle.move(1)
-
-        for b in list(self.balls):
-            if b.stuck:
-                b.x = self.paddle.x + self.paddle.width//2
-                b.y = self.paddle.y - b.radius - 2
-            b.update(dt)
-            if b.y - b.radius > SCREEN_HEIGHT:
-                try:
-                    self.balls.remove(b)
-                except ValueError:
-                    pass
-        if len(self.balls) == 0:
-            self.lives -= 1
-            if self.lives <= 0:
-                self.state = 'game_over'
-                return
-            else:
-                self.balls = [Ball(self.paddle.x + self.paddle.width//2, self.paddle.y - BALL_RADIUS - 2)]
-        to_remove = []
-        for k in list(self.active_powers.keys()):
-            decay = REVERSE_DURATION if k == 'REVERSE' else POWER_DURATION
-            self.active_powers[k] -= dt / FPS * (REVERSE_DURATION/REVERSE_DURATION if k=='REVERSE' else POWER_DURATION/POWER_DURATION)
-            if self.active_powers[k] <= 0:
-                to_remove.append(k)
-        for k in to_remove:
-            self.remove_power(k)
-        for p in self.powerups:
-            p.update(dt)
-        self.handle_collisions()
-        if len(self.bricks) == 0 and self.state == 'playing':
-            if self.level < MAX_LEVEL:
-                self.state = 'level_popup'
-                self.popup_message = f'Level {self.level} Cleared!'
-                if self.level > self.best_level:
-                    self.best_level = self.level
-            else:
-                self.state = 'max_popup'
-                self.popup_message = f"You've reached the Max Level ({MAX_LEVEL})!"
-                self.popup_sub = f"Best Level: {self.best_level}"
+        sim = self.sim
+        sim.advance(dt, keys[pygame.K_LEFT], keys[pygame.K_RIGHT], self.launch_requested)
+        self.launch_requested = False
+        self.play_events()
+        if sim.state == 'game_over':
+            self.state = 'game_over'
+        elif sim.state == 'cleared':
+            self.state = 'level_popup'
+            self.popup_message = f'Level {sim.level} Cleared!'
+        elif sim.state == 'max_level':
+            self.state = 'max_popup'
+            self.popup_message = f"You've reached the Max Level ({MAX_LEVEL})!"
+            self.popup_sub = f"Best Level: {sim.best_level}"
+
+    def play_events(self):
+        # turn the simulation's sound cues into (at most) one play per category
+        for event in self.sim.events:
+            self.sound.trigger(event)
+        self.sim.events.clear()
+        self.sound.flush()
 
     # ---------- Visual/UI helpers ----------
-    def lerp(self, a, b, t):
-        return (int(a[0]*(1-t) + b[0]*t), int(a[1]*(1-t) + b[1]*t), int(a[2]*(1-t) + b[2]*t))
-
     def draw_background(self):
-        # sky color based on time_of_day (0..1). We'll make cycle: morning(0) -> day(0.25) -> sunset(0.45) -> night(0.65) -> dawn(0.9) -> morning
-        t = self.time_of_day
-        if t < 0.25:  # morning -> day
-            local_t = t / 0.25
-            top = self.lerp((90,140,220), (120,180,255), local_t)
-            bottom = self.lerp((200,220,255), (240,245,255), local_t)
-        elif t < 0.45:  # day -> sunset
-            local_t = (t-0.25) / 0.2
-            top = self.lerp((120,180,255), (240,140,80), local_t)
-            bottom = self.lerp((240,245,255), (250,200,140), local_t)
-        elif t < 0.65:  # sunset -> night
-            local_t = (t-0.45) / 0.2
-            top = self.lerp((240,140,80), (20,30,60), local_t)
-            bottom = self.lerp((250,200,140), (6,10,30), local_t)
-        elif t < 0.9:  # night -> dawn
-            local_t = (t-0.65) / 0.25
-            top = self.lerp((20,30,60), (140,100,180), local_t)
-            bottom = self.lerp((6,10,30), (200,150,200), local_t)
-        else:  # dawn -> morning
-            local_t = (t-0.9) / 0.1
-            top = self.lerp((140,100,180), (90,140,220), local_t)
-            bottom = self.lerp((200,150,200), (200,220,255), local_t)
-
-        # vertical gradient
-        for i in range(SCREEN_HEIGHT):
-            tt = i / SCREEN_HEIGHT
-            col = (int(top[0]*(1-tt) + bottom[0]*tt), int(top[1]*(1-tt) + bottom[1]*tt), int(top[2]*(1-tt) + bottom[2]*tt))
-            pygame.draw.line(self.screen, col, (0,i), (SCREEN_WIDTH,i))
+        self.draw_sky(self.screen, self.time_of_day)
+        # stars (more visible at night)
+        night_intensity = max(0.0, (0.5 - abs(self.time_of_day - 0.5)) * 2.0)
+        particles = self.particles
+        if int(180 * night_intensity) > 8:
+            particles.draw_stars(self.screen)
+        particles.draw_clouds(self.screen)
+        if self.weather == 'rain':
+            particles.draw_rain(self.screen)
+        particles.advance(night_intensity)
+
+        # lightning flash (very brief overlay)
+        if self.weather == 'rain' and self.lightning_timer and self.rng.random() < 0.06:
+            if self.flash is None:
+                self.flash = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+                self.flash.fill((255,255,255,60))
+            self.screen.blit(self.flash, (0,0))
+
+    def draw_sky(self, surf, time_of_day):
+        surf.blit(self.sky.get(time_of_day), (0,0))
 
         # sun/moon position along an arc
-        sun_x = int((SCREEN_WIDTH+200) * (0.1 + 0.8 * self.time_of_day)) - 100
-        sun_y = int(120 + math.sin(self.time_of_day * math.pi * 2) * 100)
-        if 0.05 < self.time_of_day < 0.55:
+        sun_x = int((SCREEN_WIDTH+200) * (0.1 + 0.8 * time_of_day)) - 100
+        sun_y = int(120 + math.sin(time_of_day * math.pi * 2) * 100)
+        if 0.05 < time_of_day < 0.55:
             # sun visible
             radius = 48
-            glow = pygame.Surface((radius*6, radius*6), pygame.SRCALPHA)
+            if self.sun_glow is None:
+                self.sun_glow = pygame.Surface((radius*6, radius*6), pygame.SRCALPHA)
+                for i, a in enumerate([20,40,80,120]):
+                    pygame.draw.circle(self.sun_glow, (255,220,140,a), (radius*3, radius*3), radius + i*8)
+            glow = self.sun_glow
             gx = glow.get_width()//2
             gy = glow.get_height()//2
-            for i, a in enumerate([20,40,80,120]):
-                pygame.draw.circle(glow, (255,220,140,a), (gx,gy), radius + i*8)
-            self.screen.blit(glow, (sun_x - gx, sun_y - gy), special_flags=pygame.BLEND_PREMULTIPLIED)
-            pygame.draw.circle(self.screen, (255,230,160), (sun_x, sun_y), radius)
+            surf.blit(glow, (sun_x - gx, sun_y - gy), special_flags=pygame.BLEND_PREMULTIPLIED)
+            pygame.draw.circle(surf, (255,230,160), (sun_x, sun_y), radius)
         else:
             # moon + stars brighter at night
             radius = 32
             # small moon glow
-            moon_surf = pygame.Surface((radius*4, radius*4), pygame.SRCALPHA)
+            if self.moon_glow is None:
+                self.moon_glow = pygame.Surface((radius*4, radius*4), pygame.SRCALPHA)
+                pygame.draw.circle(self.moon_glow, (220,230,255,140), (radius*2, radius*2), radius+6)
+            moon_surf = self.moon_glow
             mgx = moon_surf.get_width()//2
             mgy = moon_surf.get_height()//2
-            pygame.draw.circle(moon_surf, (220,230,255,140), (mgx,mgy), radius+6)
-            self.screen.blit(moon_surf, (sun_x-mgx, sun_y-mgy))
-            pygame.draw.circle(self.screen, (220,230,255), (sun_x, sun_y), radius)
-
-        # stars (more visible at night)
-        night_intensity = max(0.0, (0.5 - abs(self.time_of_day - 0.5)) * 2.0)
-        for s in self.stars:
-            alpha = int(180 * night_intensity)
-            if alpha > 8:
-                pygame.draw.circle(self.screen, (220,240,255), (int(s['x']), int(s['y'])), s['r'])
-            s['y'] += 0.25 * (1 + 2*night_intensity)
-            if s['y'] > SCREEN_HEIGHT:
-                s['y'] = -2
-                s['x'] = random.randint(0, SCREEN_WIDTH)
-
-        # clouds
-        if self.clouds:
-            for c in self.clouds:
-                rect = pygame.Rect(int(c['x']), int(c['y']), c['w'], 60)
-                cloud_surf = pygame.Surface((rect.width, rect.height), pygame.SRCALPHA)
-                # layered ellipses for soft cloud
-                for i in range(5):
-                    pygame.draw.ellipse(cloud_surf, (255,255,255,80), (i*10, 0, rect.width- i*20, rect.height))
-                self.screen.blit(cloud_surf, rect.topleft)
-                c['x'] += c['speed']
-                if c['x'] > SCREEN_WIDTH + 200:
-                    c['x'] = -c['w'] - 100
-
-        # rain
-        if self.weather == 'rain' and self.rain:
-            for drop in self.rain:
-                x = int(drop['x'])
-                y = int(drop['y'])
-                ln = drop['len']
-                pygame.draw.line(self.screen, (180,200,230), (x, y), (x+2, y+ln), 1)
-                drop['y'] += drop['speed']
-                drop['x'] += 0.6
-                if drop['y'] > SCREEN_HEIGHT:
-                    drop['y'] = random.randint(-SCREEN_HEIGHT, -10)
-                    drop['x'] = random.randint(0, SCREEN_WIDTH)
-
-        # lightning flash (very brief overlay)
-        if self.weather == 'rain' and self.lightning_timer and random.random() < 0.06:
-            flash = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            flash.fill((255,255,255,60))
-            self.screen.blit(flash, (0,0))
+            surf.blit(moon_surf, (sun_x-mgx, sun_y-mgy))
+            pygame.draw.circle(surf, (220,230,255), (sun_x, sun_y), radius)
 
     def draw_hud(self):
         hud_rect = pygame.Rect(10,10,260,92)
-        panel = pygame.Surface((hud_rect.width, hud_rect.height), pygame.SRCALPHA)
-        panel.fill((12,18,28,180))
-        pygame.draw.rect(panel, WHITE, panel.get_rect(), 2, border_radius=10)
-        self.screen.blit(panel, (hud_rect.x, hud_rect.y))
-        score_surf = self.font.render(f'Score: {self.score}', True, WHITE)
-        lives_surf = self.font.render(f'Lives: {self.lives}', True, WHITE)
-        level_surf = self.font.render(f'Level: {self.level}', True, WHITE)
-        best_surf = self.font.render(f'Best: {self.best_level}', True, WHITE)
+        if self.hud_panel is None:
+            panel = pygame.Surface((hud_rect.width, hud_rect.height), pygame.SRCALPHA)
+            panel.fill((12,18,28,180))
+            pygame.draw.rect(panel, WHITE, panel.get_rect(), 2, border_radius=10)
+            self.hud_panel = panel
+        self.screen.blit(self.hud_panel, (hud_rect.x, hud_rect.y))
+        # text surfaces are cached by string, so these only re-render on change
+        score_surf = render_text(f'Score: {self.sim.score}', 20, WHITE)
+        lives_surf = render_text(f'Lives: {self.sim.lives}', 20, WHITE)
+        level_surf = render_text(f'Level: {self.sim.level}', 20, WHITE)
+        best_surf = render_text(f'Best: {self.sim.best_level}', 20, WHITE)
         self.screen.blit(score_surf, (22,18))
         self.screen.blit(lives_surf, (22,38))
         self.screen.blit(level_surf, (22,58))
         self.screen.blit(best_surf, (140,58))
         center_x = SCREEN_WIDTH//2
         y = 12
-        small = pygame.font.SysFont(None, 18)
-        kinds = list(self.active_powers.keys())
+        kinds = list(self.sim.active_powers.keys())
         for idx, kind in enumerate(kinds):
-            remaining = max(0.0, self.active_powers[kind])
+            remaining = self.sim.power_remaining(kind)
             box_w = 160
             bx = center_x - (len(kinds) * (box_w+8))//2 + idx*(box_w+8)
             rect = pygame.Rect(bx, y, box_w, 28)
             pygame.draw.rect(self.screen, (18,20,28), rect, border_radius=8)
             pygame.draw.rect(self.screen, WHITE, rect, 2, border_radius=8)
-            label = small.render(f'{kind}', True, WHITE)
+            label = render_text(kind, 18, WHITE)
             self.screen.blit(label, (bx+8, y+4))
-            pct = remaining / (REVERSE_DURATION if kind=='REVERSE' else POWER_DURATION)
+            pct = remaining / POWER_EFFECTS[kind]['duration']
             bar_w = int((box_w-16) * pct)
             bar_rect = pygame.Rect(bx+8, y+18, bar_w, 6)
             pygame.draw.rect(self.screen, GREEN, bar_rect, border_radius=4)
@@ -640,24 +2177,21 @@ class Game:
         self.draw_background()
     
     # Title
-        title_font = pygame.font.SysFont(None, 72)
-        title = title_font.render('BRICK BREAKER', True, (255, 255, 255))
+        title = render_text('BRICK BREAKER', 72, (255, 255, 255))
         self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 80))
     
     # Subtitle (Start prompt)
-        subtitle_font = pygame.font.SysFont(None, 26)
-        subtitle = subtitle_font.render('Press ENTER to Start — Visual Upgrade', True, (190, 210, 255))
+        subtitle = render_text('Press ENTER to Start — Visual Upgrade', 26, (190, 210, 255))
         self.screen.blit(subtitle, (SCREEN_WIDTH//2 - subtitle.get_width()//2, 155))
     
     # “Powered by” footer
-        credit_font = pygame.font.SysFont("arial", 20)
-        credit = credit_font.render('Powered by POTPOT GAMES', True,(0, 255, 255))
+        credit = render_text('Powered by POTPOT GAMES', 20, (0, 255, 255), "arial")
         self.screen.blit(credit, (SCREEN_WIDTH//2 - credit.get_width()//2, 185))
 
         bx = SCREEN_WIDTH//2 - 120
         by = 280
         if not self.menu_buttons:
-            self.menu_buttons = [Button((bx,by,240,54),'Start (ENTER)'),
+            self.menu_buttons = [Button((bx,by,240,54),'Start (ENTER)','Start'),
                                  Button((bx,by+80,240,54),'Instructions'),
                                  Button((bx,by+160,240,54),'Settings'),
                                  Button((bx,by+240,240,54),'Exit')]
@@ -667,24 +2201,21 @@ class Game:
 
     def draw_settings(self):
         self.draw_background()
-        big = pygame.font.SysFont(None, 48)
-        title = big.render('Settings', True, WHITE)
+        title = render_text('Settings', 48, WHITE)
         self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 80))
         if not self.settings_buttons:
             bx = SCREEN_WIDTH//2 - 140
             by = 220
-            self.settings_buttons = [Button((bx,by,280,54), f'Sound: {"On" if self.sound_on else "Off"}'),
+            self.settings_buttons = [Button((bx,by,280,54), f'Sound: {"On" if self.sound.enabled else "Off"}', 'Sound'),
                                      Button((bx,by+80,280,54),'Back')]
-        self.settings_buttons[0].label = f'Sound: {"On" if self.sound_on else "Off"}'
+        self.settings_buttons[0].label = f'Sound: {"On" if self.sound.enabled else "Off"}'
         for b in self.settings_buttons:
             b.draw(self.screen)
 
     def draw_instructions(self):
         self.draw_background()
-        big = pygame.font.SysFont(None, 38)
-        title = big.render('Instructions', True, WHITE)
+        title = render_text('Instructions', 38, WHITE)
         self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 40))
-        small = pygame.font.SysFont(None, 20)
         lines = [
             'Controls: Left/Right arrows to move the paddle (reversed by Reverse power-up).',
             'Press ENTER or SPACE to launch stuck balls. P to pause. Mouse to press menu buttons.',
@@ -699,188 +2230,797 @@ class Game:
         ]
         y = 120
         for line in lines:
-            self.screen.blit(small.render(line, True, WHITE), (120, y))
+            self.screen.blit(render_text(line, 20, WHITE), (120, y))
             y += 28
-        back = Button((SCREEN_WIDTH-180, SCREEN_HEIGHT-100, 140, 54), 'Back')
-        back.draw(self.screen)
-        self.instr_back = back
+        if self.instr_back is None:
+            self.instr_back = Button((SCREEN_WIDTH-180, SCREEN_HEIGHT-100, 140, 54), 'Back')
+        self.instr_back.draw(self.screen)
 
     def draw_popup(self, message, labels):
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((6,6,12,180))
-        self.screen.blit(overlay, (0,0))
+        if self.popup_overlay is None:
+            self.popup_overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+            self.popup_overlay.fill((6,6,12,180))
+        self.screen.blit(self.popup_overlay, (0,0))
         w,h = 640, 320
         x = (SCREEN_WIDTH-w)//2
         y = (SCREEN_HEIGHT-h)//2
         box = pygame.Rect(x,y,w,h)
         pygame.draw.rect(self.screen, (22,28,40), box, border_radius=14)
         pygame.draw.rect(self.screen, WHITE, box, 3, border_radius=14)
-        big = pygame.font.SysFont(None, 32)
         lines = message.split('\n')
 
         for i, line in enumerate(lines):
-            txt = big.render(line, True, WHITE)
+            txt = render_text(line, 32, WHITE)
             self.screen.blit(txt, (x+30, y+30 + i*38))
 
         # optional popup_sub (used for max level best display)
         if hasattr(self, 'popup_sub'):
-            sub_font = pygame.font.SysFont(None, 24)
-            sub_txt = sub_font.render(self.popup_sub, True, GREY)
+            sub_txt = render_text(self.popup_sub, 24, GREY)
             self.screen.blit(sub_txt, (x+30, y+30 + (len(lines))*38 + 6))
 
-        self.popup_buttons = []
-        btn_w = 160
-        btn_h = 54
-        spacing = 20
-        total_w = len(labels)*btn_w + (len(labels)-1)*spacing
-        start_x = x + (w - total_w)//2
-        by = y + h - 100
-        for i, lab in enumerate(labels):
-            rect = (start_x + i*(btn_w+spacing), by, btn_w, btn_h)
-            btn = Button(rect, lab)
+        # buttons are built once per label set and reused every frame
+        labels = tuple(labels)
+        buttons = self.popup_cache.get(labels)
+        if buttons is None:
+            buttons = []
+            btn_w = 160
+            btn_h = 54
+            spacing = 20
+            total_w = len(labels)*btn_w + (len(labels)-1)*spacing
+            start_x = x + (w - total_w)//2
+            by = y + h - 100
+            for i, lab in enumerate(labels):
+                rect = (start_x + i*(btn_w+spacing), by, btn_w, btn_h)
+                buttons.append(Button(rect, lab))
+            self.popup_cache[labels] = buttons
+        for btn in buttons:
             btn.draw(self.screen)
-            self.popup_buttons.append(btn)
+        self.popup_buttons = buttons
 
     def draw_game(self):
+        prof = self.prof
         self.draw_background()
-        for brick in self.bricks:
-            brick.draw(self.screen)
-        self.paddle.draw(self.screen)
-        for b in self.balls:
-            b.draw(self.screen)
-        for p in self.powerups:
-            p.draw(self.screen)
+        if prof: prof.lap('background')
+        self.sim.bricks.draw(self.screen)
+        if prof: prof.lap('bricks')
+        self.draw_actors()
+        if prof: prof.lap('actors')
         self.draw_hud()
+        if prof: prof.lap('hud')
+
+    def draw_actors(self):
+        self.sim.paddle.draw(self.screen)
+        self.sim.balls.draw(self.screen)
+        for p in self.sim.powerups:
+            p.draw(self.screen)
+
+    def draw_max_popup(self):
+        # ensure popup_sub exists
+        if not hasattr(self, 'popup_sub'):
+            self.popup_sub = f"Best Level: {self.sim.best_level}"
+        self.draw_popup(self.popup_message, ('Restart Game','Exit'))
+
+    def draw_overlay(self):
+        # popups drawn on top of the game view, if the state has one
+        overlay = self.states[self.state].overlay
+        if overlay is not None:
+            overlay()
+
+    def draw_game_view(self):
+        self.draw_game()
+        self.draw_overlay()
+        if self.prof: self.prof.lap('overlay')
 
     def run(self):
         while self.running:
             dt = self.clock.tick(FPS) / (1000.0 / FPS)
+            prof = self.prof = self.profiler if self.profiler.active else None
+            if prof:
+                prof.begin()
             for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                elif event.type == pygame.KEYDOWN:
-                    if self.state == 'menu':
-                        if event.key == pygame.K_RETURN:
-                            self.state = 'playing'
-                            self.reset_level(first=True)
-                        elif event.key == pygame.K_i:
-                            self.state = 'instructions'
-                        elif event.key == pygame.K_s:
-                            self.state = 'settings'
-                    elif self.state == 'settings':
-                        if event.key == pygame.K_ESCAPE:
-                            self.state = 'menu'
-                    elif self.state == 'instructions':
-                        if event.key == pygame.K_ESCAPE:
-                            self.state = 'menu'
-                    elif self.state == 'playing':
-                        if event.key in (pygame.K_SPACE, pygame.K_RETURN):
-                            for b in self.balls:
-                                if b.stuck:
-                                    b.stuck = False
-                                    b.vx = random.choice([-BASE_SPEED, -BASE_SPEED+1, BASE_SPEED-1, BASE_SPEED])
-                                    b.vy = -abs(BASE_SPEED)
-                        if event.key == pygame.K_p:
-                            self.state = 'paused'
-                    elif self.state == 'paused':
-                        if event.key == pygame.K_p:
-                            self.state = 'playing'
-                    elif self.state in ('level_popup','max_popup'):
-                        if event.key == pygame.K_n and self.state == 'level_popup':
-                            if self.level < MAX_LEVEL:
-                                self.level += 1
-                                self.reset_level()
-                                self.state = 'playing'
-                        if event.key == pygame.K_r and self.state == 'max_popup':
-                            self.restart_game()
-                    elif self.state == 'game_over':
-                        if event.key == pygame.K_r:
-                            self.restart_game()
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    mx,my = event.pos
-                    if self.state == 'menu':
-                        for b in self.menu_buttons:
-                            if b.clicked((mx,my)):
-                                lab = b.label
-                                if lab.startswith('Start'):
-                                    self.state = 'playing'
-                                    self.reset_level(first=True)
-                                elif lab == 'Instructions':
-                                    self.state = 'instructions'
-                                elif lab == 'Settings':
-                                    self.state = 'settings'
-                                elif lab == 'Exit':
-                                    self.running = False
-                    elif self.state == 'settings':
-                        for b in self.settings_buttons:
-                            if b.clicked((mx,my)):
-                                if b.label.startswith('Sound'):
-                                    self.sound_on = not self.sound_on
-                                elif b.label == 'Back':
-                                    self.state = 'menu'
-                    elif self.state == 'instructions':
-                        if hasattr(self, 'instr_back') and self.instr_back.clicked((mx,my)):
-                            self.state = 'menu'
-                    elif self.state == 'playing':
-                        pass
-                    elif self.state == 'paused':
-                        self.state = 'playing'
-                    elif self.state in ('level_popup','max_popup'):
-                        for b in self.popup_buttons:
-                            if b.clicked((mx,my)):
-                                lab = b.label
-                                if lab == 'Next':
-                                    if self.level < MAX_LEVEL:
-                                        self.level += 1
-                                    self.reset_level()
-                                    self.state = 'playing'
-                                elif lab == 'Previous':
-                                    if self.level > 1:
-                                        self.level -= 1
-                                    self.reset_level()
-                                    self.state = 'playing'
-                                elif lab == 'Exit':
-                                    self.running = False
-                                elif lab in ('Restart Game','Play Again'):
-                                    self.restart_game()
-                                    self.state = 'playing'
-                    elif self.state == 'game_over':
-                        for b in self.popup_buttons:
-                            if b.clicked((mx,my)):
-                                if b.label == 'Play Again':
-                                    self.restart_game()
-                                elif b.label == 'Exit':
-                                    self.running = False
-
-            if self.state == 'playing':
-                self.update(dt)
-            if self.state == 'menu':
-                self.draw_menu()
-            elif self.state == 'settings':
-                self.draw_settings()
-            elif self.state == 'instructions':
-                self.draw_instructions()
-            elif self.state == 'playing':
-                self.draw_game()
-            elif self.state == 'paused':
-                self.draw_game()
-                self.draw_popup('Paused', ['Resume','Exit'])
-            elif self.state == 'level_popup':
-                self.draw_game()
-                self.draw_popup(self.popup_message, ['Previous','Next','Exit'])
-            elif self.state == 'max_popup':
-                self.draw_game()
-                # ensure popup_sub exists
-                if not hasattr(self, 'popup_sub'):
-                    self.popup_sub = f"Best Level: {self.best_level}"
-                self.draw_popup(self.popup_message, ['Restart Game','Exit'])
-            elif self.state == 'game_over':
-                self.draw_game()
-                self.draw_popup('Game Over', ['Play Again','Exit'])
+                self.dispatch(event)
+
+            if prof:
+                prof.lap('events')
+                self.sim.timing = True
+                self.sim.collision_time = 0.0
+
+            state = self.states[self.state]
+            if state.update is not None:
+                state.update(dt)
+            if prof:
+                prof.lap('update')
+                prof.split('collisions', self.sim.collision_time, 'update')
+                self.sim.timing = False
+            state = self.states[self.state]  # update may have ended the level
+            if self.renderer is not None and state.game_view:
+                self.renderer.render()
+            elif state.static and self.state == self.presented:
+                pass  # nothing on a static screen has changed since it was shown
+            else:
+                if self.renderer is not None:
+                    self.renderer.invalidate()
+                state.draw()
+                if prof: prof.lap('ui')
+                if self.profiler.visible:
+                    self.profiler.draw(self.screen)
+                    if prof: prof.lap('profiler')
+
+                pygame.display.flip()
+                if prof: prof.lap('flip')
+            self.presented = self.state
+            if prof:
+                prof.end()
+
+            if self.profile:
+                self.profile.mark('first frame')
+                print(self.profile.report())
+                self.profile = None
+                self.running = False
+
+        if self.record_path:
+            self.sim.log.save(self.record_path)
+        if self.profiler.trace is not None:
+            self.profiler.save()
+        clear_render_caches()
+        pygame.quit()
 
-            pygame.display.flip()
+# --------- Headless batch runner ---------
+def autopilot(sim, scripted=False, t=0):
+    # returns (left, right, launch) for a paddle that either tracks the most
+    # urgent ball (predicting wall bounces) or just sweeps back and forth
+    paddle = sim.paddle
+    center = paddle.x + paddle.width / 2
+    pool = sim.balls
+    n = pool.n
+    launch = n > 0 and bool(pool.stuck[:n].any())
+    if scripted or not n:
+        target = SCREEN_WIDTH/2 + (SCREEN_WIDTH/2 - paddle.width/2) * math.sin(t / 90.0)
+    else:
+        falling = pool.vy[:n] > 0
+        candidates = np.flatnonzero(falling) if falling.any() else np.arange(n)
+        i = candidates[np.argmax(pool.y[:n][candidates])]
+        x = pool.x[i]
+        vy = pool.vy[i]
+        if vy > 0:
+            # unfold the wall reflections to where the ball meets the paddle
+            span = SCREEN_WIDTH - 2*pool.radius[i]
+            x = x - pool.radius[i] + pool.vx[i] * (paddle.y - pool.y[i]) / vy
+            x = x % (2*span)
+            x = (x if x <= span else 2*span - x) + pool.radius[i]
+        target = x
+    dead_zone = paddle.speed / 2
+    return target < center - dead_zone, target > center + dead_zone, launch
+
+def capture_game(seed, frames, capture, max_steps=60*60*FPS, scripted=False):
+    # one autopilot game, keeping up to `frames` captured frames
+    sim = Simulation(seed)
+    out = np.empty((frames,) + capture.shape, np.uint8)
+    kept = 0
+    for step in range(max_steps):
+        if kept == frames or sim.state not in ('playing', 'cleared'):
+            break
+        if sim.state == 'cleared':
+            sim.level += 1
+            sim.reset_level()
+        left, right, launch = autopilot(sim, scripted, step)
+        sim.step(SIM_DT, left, right, launch)
+        sim.events.clear()
+        if capture.capture(sim, out[kept]) is not None:
+            kept += 1
+    return out[:kept]
+
+def init_batch_worker(powerup_chance, bomb_chance):
+    global POWERUP_CHANCE, BOMB_BRICK_CHANCE
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    POWERUP_CHANCE = powerup_chance
+    BOMB_BRICK_CHANCE = bomb_chance
+
+def run_headless_game(job):
+    # one seeded game with no window, mixer or frame pacing
+    seed, max_steps, scripted = job
+    sim = Simulation(seed)
+    cleared = 0
+    steps = 0
+    start = time.perf_counter()
+    while steps < max_steps:
+        left, right, launch = autopilot(sim, scripted, steps)
+        sim.step(SIM_DT, left, right, launch)
+        sim.events.clear()
+        steps += 1
+        if sim.state == 'cleared':
+            cleared += 1
+            sim.level += 1
+            sim.reset_level()
+        elif sim.state != 'playing':
+            if sim.state == 'max_level':
+                cleared += 1
+            break
+    return {'seed': seed, 'score': sim.score, 'levels_cleared': cleared, 'level': sim.level,
+            'steps': steps, 'outcome': sim.state, 'seconds': time.perf_counter() - start}
+
+def run_batch(games, seed=0, workers=None, max_steps=60*60*FPS, scripted=False,
+              powerup_chance=POWERUP_CHANCE, bomb_chance=BOMB_BRICK_CHANCE):
+    import multiprocessing
+    workers = workers or os.cpu_count() or 1
+    jobs = [(seed + i, max_steps, scripted) for i in range(games)]
+    start = time.perf_counter()
+    if workers == 1:
+        init_batch_worker(powerup_chance, bomb_chance)
+        results = [run_headless_game(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(workers, init_batch_worker, (powerup_chance, bomb_chance)) as pool:
+            results = list(pool.imap_unordered(run_headless_game, jobs, chunksize=max(1, games // (workers*4))))
+    wall = time.perf_counter() - start
+    results.sort(key=lambda r: r['seed'])
+    summary = summarize_batch(results, wall, workers)
+    summary['powerup_chance'] = powerup_chance
+    summary['bomb_chance'] = bomb_chance
+    return summary
+
+def summarize_batch(results, wall, workers):
+    import statistics
+    scores = [r['score'] for r in results]
+    cleared = [r['levels_cleared'] for r in results]
+    steps = sum(r['steps'] for r in results)
+    cpu = sum(r['seconds'] for r in results)
+    quantiles = statistics.quantiles(scores, n=10, method='inclusive') if len(scores) > 1 else scores * 9
+    return {
+        'games': len(results),
+        'workers': workers,
+        'levels_cleared': {'mean': statistics.fmean(cleared), 'median': statistics.median(cleared),
+                           'max': max(cleared), 'total': sum(cleared)},
+        'score': {'mean': statistics.fmean(scores), 'median': statistics.median(scores),
+                  'min': min(scores), 'max': max(scores),
+                  'p10': quantiles[0], 'p90': quantiles[-1]},
+        'outcomes': {k: sum(1 for r in results if r['outcome'] == k) for k in sorted({r['outcome'] for r in results})},
+        'steps': steps,
+        'wall_seconds': wall,
+        'steps_per_second': steps / wall if wall else 0.0,
+        'steps_per_second_per_worker': steps / cpu if cpu else 0.0,
+        'games_detail': results,
+    }
 
-        pygame.quit()
+def format_batch(summary):
+    lc = summary['levels_cleared']
+    sc = summary['score']
+    lines = [
+        f"games: {summary['games']}  workers: {summary['workers']}  "
+        f"POWERUP_CHANCE={summary['powerup_chance']}  BOMB_BRICK_CHANCE={summary['bomb_chance']}",
+        f"levels cleared: mean {lc['mean']:.2f}  median {lc['median']}  max {lc['max']}  total {lc['total']}",
+        f"score: mean {sc['mean']:.1f}  median {sc['median']}  p10 {sc['p10']:.0f}  p90 {sc['p90']:.0f}  "
+        f"min {sc['min']}  max {sc['max']}",
+        'outcomes: ' + '  '.join(f'{k} {v}' for k, v in summary['outcomes'].items()),
+        f"steps: {summary['steps']}  wall {summary['wall_seconds']:.2f}s  "
+        f"{summary['steps_per_second']:.0f} steps/s ({summary['steps_per_second_per_worker']:.0f} per worker)",
+    ]
+    return '\n'.join(lines)
+
+# --------- Headless frame capture ---------
+HEADLESS_GAME = []  # one hidden Game whose draw_game() renders captured/benchmarked frames
+
+def headless_game():
+    if not HEADLESS_GAME:
+        if pygame.display.get_surface() is None:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        HEADLESS_GAME.append(Game(seed=BENCH_SEED))
+    return HEADLESS_GAME[0]
+
+class FrameCapture:
+    # Observation frames of a Simulation as uint8 arrays, (H, W, 3) or (H, W)
+    # when grayscale, downscaled by `scale`.
+    #   'pixels'   draw_game() into the hidden screen, downscale in C into a
+    #              small surface and copy it out through surfarray views
+    #              (pixels3d, or pixels_red/green/blue for grayscale)
+    #   'symbolic' skip pygame entirely: bricks, paddle, balls and power-ups
+    #              are rasterized straight into the array (no sky or weather)
+    # capture() only renders every `skip`-th call and returns None otherwise.
+    def __init__(self, mode='symbolic', scale=CAPTURE_SCALE, grayscale=False, skip=CAPTURE_SKIP):
+        if mode not in ('pixels', 'symbolic'):
+            raise ValueError(f'unknown capture mode: {mode}')
+        self.mode = mode
+        self.scale = scale
+        self.grayscale = grayscale
+        self.skip = skip
+        self.calls = 0
+        self.size = (SCREEN_WIDTH // scale, SCREEN_HEIGHT // scale)
+        self.shape = (self.size[1], self.size[0]) if grayscale else (self.size[1], self.size[0], 3)
+        if mode == 'pixels':
+            self.game = headless_game()
+            # the surfarray views need 32-bit pixels; a screen in another
+            # format is scaled first and converted by a blit
+            screen = self.game.screen
+            self.direct = screen.get_bitsize() == 32
+            self.small = pygame.Surface(self.size, 0, screen if self.direct else 32)
+            if grayscale:
+                # uint16 accumulators, (H, W) like the output
+                self.acc = np.empty(self.shape, np.uint16)
+                self.tmp = np.empty(self.shape, np.uint16)
+        else:
+            # map every output pixel (sampled at its centre) to a brick cell
+            # index, or to the blank entry past the last cell, once
+            ys = np.arange(self.size[1]) * scale + scale // 2 - BRICK_START_Y
+            xs = np.arange(self.size[0]) * scale + scale // 2 - BRICK_AREA_MARGIN
+            in_y = (ys >= 0) & (ys % BRICK_HEIGHT < BRICK_HEIGHT-6) & (ys < ENV_GRID_ROWS * BRICK_HEIGHT)
+            in_x = (xs >= 0) & (xs % BRICK_WIDTH < BRICK_WIDTH-6) & (xs < BRICK_COLS * BRICK_WIDTH)
+            cell = (ys // BRICK_HEIGHT)[:, None] * BRICK_COLS + (xs // BRICK_WIDTH)[None, :]
+            self.cell_index = np.where(in_y[:, None] & in_x[None, :], cell, ENV_GRID_ROWS * BRICK_COLS)
+            r = max(1, BALL_RADIUS // scale)
+            dy, dx = np.mgrid[-r:r+1, -r:r+1]
+            disc = dy*dy + dx*dx <= r*r
+            self.disc_dy = dy[disc]
+            self.disc_dx = dx[disc]
+
+    def capture(self, sim, out=None):
+        self.calls += 1
+        if (self.calls - 1) % self.skip:
+            return None
+        if out is None:
+            out = np.empty(self.shape, np.uint8)
+        if self.mode == 'pixels':
+            self.render_pixels(sim, out)
+        else:
+            self.rasterize(sim, out)
+        return out
+
+    def render_pixels(self, sim, out):
+        game = self.game
+        game.sim = sim
+        game.draw_game()
+        if self.scale == 1:
+            self.small.blit(game.screen, (0, 0))
+        elif self.direct:
+            pygame.transform.scale(game.screen, self.size, self.small)
+        else:
+            self.small.blit(pygame.transform.scale(game.screen, self.size), (0, 0))
+        # the views lock self.small, so they only live for this call
+        if self.grayscale:
+            # channels are widened to uint16 before weighting, so the sums
+            # can't wrap whatever NumPy's promotion rules are
+            acc, tmp = self.acc, self.tmp
+            np.copyto(acc, pygame.surfarray.pixels_red(self.small).T)
+            acc *= 77
+            np.copyto(tmp, pygame.surfarray.pixels_green(self.small).T)
+            tmp *= 150
+            acc += tmp
+            np.copyto(tmp, pygame.surfarray.pixels_blue(self.small).T)
+            tmp *= 29
+            acc += tmp
+            acc >>= 8
+            out[...] = acc
+        else:
+            out[...] = pygame.surfarray.pixels3d(self.small).transpose(1, 0, 2)
+
+    def gray(self, color):
+        return (77*color[0] + 150*color[1] + 29*color[2]) >> 8
+
+    def rasterize(self, sim, out):
+        # bricks come from one lookup: each output pixel indexes its cell's
+        # colour (or the blank last entry); the rest are painted on top
+        s = self.scale
+        grid = sim.bricks
+        rows = min(grid.rows, ENV_GRID_ROWS)
+        lut = np.zeros((ENV_GRID_ROWS * BRICK_COLS + 1,) + self.shape[2:], np.uint8)
+        if rows and grid.palette:
+            palette = np.array(grid.palette, np.uint8)
+            if self.grayscale:
+                palette = np.array([self.gray(c) for c in grid.palette], np.uint8)
+            alive = grid.alive[:rows].ravel()
+            cells = lut[:rows * BRICK_COLS]
+            cells[alive] = palette[grid.color[:rows].ravel()[alive]]
+        np.take(lut, self.cell_index, axis=0, out=out)
+        paddle = sim.paddle
+        out[paddle.y // s:(paddle.y + paddle.height) // s + 1, int(paddle.x) // s:int(paddle.x + paddle.width) // s + 1] = 255
+        for p in sim.powerups:
+            x, y = int(p.x) // s, int(p.y) // s
+            color = PowerUp.COLORS.get(p.kind, WHITE)
+            out[max(0, y):y + PowerUp.SIZE // s + 1, max(0, x):x + PowerUp.SIZE // s + 1] = (
+                self.gray(color) if self.grayscale else color)
+        pool = sim.balls
+        n = pool.n
+        if n:
+            ys = (pool.y[:n] // s).astype(np.intp)[:, None] + self.disc_dy
+            xs = (pool.x[:n] // s).astype(np.intp)[:, None] + self.disc_dx
+            keep = (ys >= 0) & (ys < self.shape[0]) & (xs >= 0) & (xs < self.shape[1])
+            out[ys[keep], xs[keep]] = 255
+
+# --------- Training environment ---------
+class BreakoutEnv:
+    # Gym-style wrapper over Simulation: no window, mixer or clock. Actions are
+    # INPUT_LEFT/INPUT_RIGHT/INPUT_LAUNCH bitmasks (0..7); reward is score
+    # gained. Observations are a dict of arrays:
+    #   balls  (ENV_MAX_BALLS, 5) float32  x, y, vx, vy, present (lowest balls first)
+    #   paddle (2,) float32                x, width
+    #   bricks (ENV_GRID_ROWS, BRICK_COLS) uint8 occupancy of the on-screen rows
+    #   frame  FrameCapture.shape uint8    only with frame='pixels'/'symbolic'
+    # Clearing a level moves on to the next one; the episode ends at game
+    # over or MAX_LEVEL and is truncated after max_steps.
+    n_actions = 8
+
+    def __init__(self, frame_skip=ENV_FRAME_SKIP, max_steps=ENV_MAX_STEPS, level=1,
+                 frame=None, frame_scale=CAPTURE_SCALE, grayscale=False):
+        self.frame_skip = frame_skip
+        self.max_steps = max_steps
+        self.start_level = level
+        self.capture = FrameCapture(frame, frame_scale, grayscale) if frame else None
+        self.sim = None
+
+    def buffers(self, *lead):
+        # empty observation arrays, with optional leading (batch) dimensions
+        obs = {'balls': np.zeros(lead + (ENV_MAX_BALLS, 5), np.float32), 'paddle': np.zeros(lead + (2,), np.float32),
+               'bricks': np.zeros(lead + (ENV_GRID_ROWS, BRICK_COLS), np.uint8)}
+        if self.capture is not None:
+            obs['frame'] = np.zeros(lead + self.capture.shape, np.uint8)
+        return obs
+
+    def reset(self, seed=None):
+        sim = self.sim = Simulation(seed)
+        if self.start_level != 1:
+            sim.level = sim.best_level = self.start_level
+            sim.reset_level()
+        self.steps = 0
+        self.levels_cleared = 0
+        obs = self.buffers()
+        self.observe(obs)
+        return obs, self.info()
+
+    def step(self, action):
+        obs = self.buffers()
+        reward, terminated, truncated = self.advance(action)
+        self.observe(obs)
+        return obs, reward, terminated, truncated, self.info()
+
+    def advance(self, action):
+        # run frame_skip ticks; returns (reward, terminated, truncated)
+        sim = self.sim
+        left, right, launch = bool(action & INPUT_LEFT), bool(action & INPUT_RIGHT), bool(action & INPUT_LAUNCH)
+        before = sim.score
+        for _ in range(self.frame_skip):
+            sim.step(SIM_DT, left, right, launch)
+            sim.events.clear()
+            launch = False
+            if sim.state == 'cleared':
+                self.levels_cleared += 1
+                sim.level += 1
+                sim.reset_level()
+            elif sim.state != 'playing':
+                if sim.state == 'max_level':
+                    self.levels_cleared += 1
+                break
+        self.steps += 1
+        terminated = sim.state in ('game_over', 'max_level')
+        return float(sim.score - before), terminated, not terminated and self.steps >= self.max_steps
+
+    def observe(self, obs):
+        # write the current state into preallocated arrays (see buffers())
+        sim = self.sim
+        balls = obs['balls']
+        pool = sim.balls
+        n = pool.n
+        if n:
+            order = np.argsort(-pool.y[:n])[:ENV_MAX_BALLS]
+            k = len(order)
+            balls[:k, 0] = pool.x[order]
+            balls[:k, 1] = pool.y[order]
+            balls[:k, 2] = pool.vx[order]
+            balls[:k, 3] = pool.vy[order]
+            balls[:k, 4] = 1.0
+        obs['paddle'][0] = sim.paddle.x
+        obs['paddle'][1] = sim.paddle.width
+        rows = min(ENV_GRID_ROWS, sim.bricks.rows)
+        obs['bricks'][:rows] = sim.bricks.alive[:rows]
+        if self.capture is not None:
+            self.capture.capture(sim, obs['frame'])
+
+    def info(self):
+        sim = self.sim
+        return {'score': sim.score, 'lives': sim.lives, 'level': sim.level,
+                'levels_cleared': self.levels_cleared, 'steps': self.steps}
+
+class VectorBreakoutEnv:
+    # K independent BreakoutEnvs stepped in one call, observations stacked on
+    # a leading axis. Finished environments reset themselves (seeded with the
+    # next unused seed) and report the finished episode in infos['final'].
+    def __init__(self, num_envs, **kwargs):
+        self.envs = [BreakoutEnv(**kwargs) for _ in range(num_envs)]
+        self.num_envs = num_envs
+        self.next_seed = None
+
+    def reset(self, seed=None):
+        # env i gets seed + i; later auto-resets continue from seed + K
+        seed = random.SystemRandom().randrange(2**62) if seed is None else seed
+        for i, env in enumerate(self.envs):
+            env.reset(seed + i)
+        self.next_seed = seed + self.num_envs
+        obs = self.envs[0].buffers(self.num_envs)
+        for i, env in enumerate(self.envs):
+            env.observe({key: value[i] for key, value in obs.items()})
+        return obs, self.infos()
+
+    def step(self, actions):
+        obs = self.envs[0].buffers(self.num_envs)
+        k = self.num_envs
+        rewards = np.zeros(k, np.float32)
+        terminated = np.zeros(k, bool)
+        truncated = np.zeros(k, bool)
+        final = [None] * k
+        for i, (env, action) in enumerate(zip(self.envs, np.asarray(actions).tolist())):
+            rewards[i], terminated[i], truncated[i] = env.advance(action)
+            if terminated[i] or truncated[i]:
+                final[i] = env.info()
+                env.reset(self.next_seed)
+                self.next_seed += 1
+            env.observe({key: value[i] for key, value in obs.items()})
+        infos = self.infos()
+        infos['final'] = final
+        return obs, rewards, terminated, truncated, infos
+
+    def infos(self):
+        return {key: np.array([env.info()[key] for env in self.envs])
+                for key in ('score', 'lives', 'level', 'levels_cleared', 'steps')}
+
+# --------- Benchmarks ---------
+def full_brick_field(rows, kind='normal'):
+    # every cell filled: the worst case create_bricks can produce
+    grid = BrickGrid(rows)
+    for row in range(rows):
+        for col in range(BRICK_COLS):
+            grid.add(row, col, 1 + (row % 3 == 0), kind, row_color(row, rows) if kind == 'normal' else ORANGE)
+    return grid
+
+def bench_simulation(balls, rows):
+    # seeded sim with `balls` free balls fired upward from below a full field
+    sim = Simulation(BENCH_SEED)
+    sim.bricks = full_brick_field(rows)
+    rng = np.random.default_rng(BENCH_SEED)
+    angles = rng.uniform(-2.6, -0.5, balls)
+    top = sim.bricks.bottom + 20
+    sim.balls.clear()
+    sim.balls.spawn_many(rng.uniform(40, SCREEN_WIDTH - 40, balls), rng.uniform(top, sim.paddle.y - 20, balls),
+                         BASE_SPEED * np.cos(angles), BASE_SPEED * np.sin(angles))
+    return sim
+
+def bench_game(weather='clear', time_of_day=0.6, rows=None):
+    game = headless_game()
+    game.rng.seed(BENCH_SEED)
+    game.particles = WeatherParticles(seed=BENCH_SEED)
+    game.particles.set_weather(weather)
+    game.weather = weather
+    game.time_of_day = time_of_day
+    game.lightning_timer = 0
+    game.state = 'playing'
+    if rows is not None:
+        game.sim.bricks = full_brick_field(rows)
+    return game
+
+def benchmark_cases():
+    # (name, setup, run, loops, repeats); run(state) is timed `loops` times
+    # per setup(), and each case is repeated with a fresh setup
+    deep = BRICK_ROWS_BASE + MAX_LEVEL // 3
+    screen_rows = (SCREEN_HEIGHT // 2 - BRICK_START_Y) // BRICK_HEIGHT
+    h = SIM_DT / SUBSTEPS
+    cases = []
+    for level in (1, 100, MAX_LEVEL):
+        rows = BRICK_ROWS_BASE + level // 3
+        cases.append((f'create_bricks/level_{level}', lambda: random.Random(BENCH_SEED),
+                      lambda rng, rows=rows: create_bricks(rows, rng), 5 if level < 100 else 1, 15))
+    for balls in (1, 10, 100, 1000):
+        cases.append((f'handle_collisions/{balls}_balls', lambda balls=balls: bench_simulation(balls, screen_rows),
+                      lambda sim: sim.handle_collisions(h), 50, 9))
+    for rows in (screen_rows, deep):
+        cases.append((f'explode_brick/all_bombs_{rows}_rows',
+                      lambda rows=rows: full_brick_field(rows, 'bomb'),
+                      lambda grid: explode_brick(grid.get(0, 0), grid, [0]), 1, 15))
+    def vector_env(k):
+        env = VectorBreakoutEnv(k)
+        env.reset(BENCH_SEED)
+        return env, np.random.default_rng(BENCH_SEED)
+    for k in (1, 16):
+        cases.append((f'vector_env_step/{k}_envs', lambda k=k: vector_env(k),
+                      lambda state, k=k: state[0].step(state[1].integers(0, BreakoutEnv.n_actions, k)), 200, 5))
+    for weather in ('clear', 'clouds', 'rain'):
+        cases.append((f'draw_background/{weather}', lambda weather=weather: bench_game(weather),
+                      lambda game: game.draw_background(), 30, 9))
+    for rows in (screen_rows, deep):
+        cases.append((f'draw_game/full_field_{rows}_rows', lambda rows=rows: bench_game('clear', 0.3, rows),
+                      lambda game: game.draw_game(), 30, 9))
+    return cases
+
+def gc_pressure(frames=BENCH_GC_FRAMES, warmup=300):
+    # autopilot play with drawing and the collector left on, after a warm-up
+    # that fills the sprite/text caches. One pass counts collections and heap
+    # growth; a second pass under tracemalloc (whose own bookkeeping would
+    # skew the block count) measures the transient bytes of sim.step and
+    # draw_game separately. The autopilot itself is not counted.
+    game = bench_game('clouds')
+    sim = game.sim
+    sim.command(CMD_RESTART)
+    def control(t):
+        if sim.state == 'cleared':
+            sim.command(CMD_NEXT)
+        elif sim.state != 'playing':
+            sim.command(CMD_RESTART)
+        return autopilot(sim, False, t)
+    def frame(t):
+        sim.step(SIM_DT, *control(t))
+        sim.events.clear()
+        game.draw_game()
+    for t in range(warmup):
+        frame(t)
+    counter = GCCounter()
+    counter.sample()
+    try:
+        for t in range(warmup, warmup + frames):
+            frame(t)
+        _, blocks, _ = counter.sample()
+    finally:
+        counter.close()
+    result = {'frames': frames, 'collections': counter.collections, 'blocks_per_frame': blocks / frames}
+    counter = GCCounter(allocations=True)
+    step_bytes = []
+    draw_bytes = []
+    try:
+        for t in range(warmup + frames, warmup + 2 * frames):
+            left, right, launch = control(t)
+            counter.sample()
+            sim.step(SIM_DT, left, right, launch)
+            sim.events.clear()
+            step_bytes.append(counter.sample()[2])
+            game.draw_game()
+            draw_bytes.append(counter.sample()[2])
+    finally:
+        counter.close()
+    for name, samples in (('step_peak_bytes', step_bytes), ('draw_peak_bytes', draw_bytes)):
+        samples.sort()
+        result[name] = {'median': samples[frames // 2], 'max': samples[-1]}
+    return result
+
+def time_case(setup, run, loops, repeats):
+    import statistics
+    samples = []
+    for _ in range(repeats):
+        state = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(loops):
+                run(state)
+            samples.append((time.perf_counter() - start) / loops * 1000)
+        finally:
+            gc.enable()
+    return {'median_ms': statistics.median(samples), 'min_ms': min(samples), 'max_ms': max(samples),
+            'loops': loops, 'repeats': repeats}
+
+def bench_meta():
+    import platform
+    import subprocess
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'pygame': pygame.version.ver,
+            'numpy': np.__version__, 'platform': platform.platform(), 'seed': BENCH_SEED}
+
+def run_benchmarks(only=None):
+    # headless: the drawing cases render into a dummy-driver window
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    results = {}
+    for name, setup, run, loops, repeats in benchmark_cases():
+        if only and only not in name:
+            continue
+        results[name] = time_case(setup, run, loops, repeats)
+        print(f"{name:<40} {results[name]['median_ms']:10.4f} ms", file=sys.stderr)
+    report = {'meta': bench_meta(), 'results': results}
+    if not only or only in 'gc_pressure':
+        report['gc'] = pressure = gc_pressure()
+        print(f"{'gc_pressure':<40} collections {pressure['collections']} in {pressure['frames']} frames, "
+              f"{pressure['blocks_per_frame']:+.2f} blocks/frame", file=sys.stderr)
+        for part in ('step', 'draw'):
+            peak = pressure[part + '_peak_bytes']
+            print(f"{'gc_pressure/' + part:<40} peak transient bytes median {peak['median']}  max {peak['max']}",
+                  file=sys.stderr)
+    return report
+
+def compare_benchmarks(current, baseline, tolerance=BENCH_TOLERANCE):
+    # returns (report lines, names of cases slower than tolerance allows)
+    base = baseline['results']
+    lines = [f"{'case':<40} {'base ms':>10} {'now ms':>10} {'change':>8}",
+             f"baseline {baseline['meta'].get('commit')}  current {current['meta'].get('commit')}"]
+    regressions = []
+    for name, result in current['results'].items():
+        if name not in base:
+            lines.append(f"{name:<40} {'-':>10} {result['median_ms']:10.4f}      new")
+            continue
+        was, now = base[name]['median_ms'], result['median_ms']
+        change = now / was - 1 if was else 0.0
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        lines.append(f'{name:<40} {was:10.4f} {now:10.4f} {change:+8.1%}{flag}')
+    return lines, regressions
+
+def main(argv=None):
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='Brick Breaker')
+    parser.add_argument('--batch', type=int, metavar='N', help='run N seeded headless games and print aggregate stats')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    parser.add_argument('--seed', type=int, default=None, help='game seed; in batch mode game i uses seed+i (default 0)')
+    parser.add_argument('--max-steps', type=int, default=60*60*FPS, help='tick limit per game')
+    parser.add_argument('--paddle', choices=('ai', 'scripted'), default='ai', help='headless paddle controller')
+    parser.add_argument('--powerup-chance', type=float, default=POWERUP_CHANCE)
+    parser.add_argument('--bomb-chance', type=float, default=BOMB_BRICK_CHANCE)
+    parser.add_argument('--json', action='store_true', help='print batch stats as JSON')
+    parser.add_argument('--record', metavar='FILE', help='record this session\'s seed and per-tick input to FILE')
+    parser.add_argument('--replay', metavar='FILE', help='replay a recorded session headless and print the result')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print a time-to-first-frame breakdown by phase, then exit')
+    parser.add_argument('--bench', nargs='?', const='', metavar='FILTER',
+                        help='run the benchmark suite headless (only cases containing FILTER, if given)')
+    parser.add_argument('--bench-out', metavar='FILE', help='write benchmark results as JSON to FILE')
+    parser.add_argument('--bench-compare', metavar='FILE',
+                        help='compare against a saved --bench-out file; exit 1 on regressions')
+    parser.add_argument('--capture', metavar='FILE', help='play one headless autopilot game and save its frames to FILE (.npz)')
+    parser.add_argument('--capture-mode', choices=('symbolic', 'pixels'), default='symbolic')
+    parser.add_argument('--capture-scale', type=int, default=CAPTURE_SCALE, help='downscale factor')
+    parser.add_argument('--capture-gray', action='store_true', help='grayscale frames')
+    parser.add_argument('--capture-skip', type=int, default=CAPTURE_SKIP, help='keep every Nth tick')
+    parser.add_argument('--capture-frames', type=int, default=1000, help='maximum frames to keep')
+    parser.add_argument('--dirty-rects', action='store_true', default=DIRTY_RECTS,
+                        help='redraw and present only the changed regions of the game view (no weather particles)')
+    parser.add_argument('--profile-trace', metavar='FILE',
+                        help='write per-frame phase timings to FILE (.csv or .json) on exit; F3 toggles the overlay')
+    args = parser.parse_args(argv)
+    if args.replay:
+        log = InputLog.load(args.replay)
+        start = time.perf_counter()
+        sim = replay(log)
+        elapsed = time.perf_counter() - start
+        ticks = sum(1 for byte in log.data if not byte & REPLAY_COMMAND)
+        print(f'seed {log.seed}: {ticks} ticks in {elapsed:.2f}s '
+              f'({ticks / FPS / max(elapsed, 1e-9):.0f}x real time)')
+        print(f'level {sim.level}  score {sim.score}  lives {sim.lives}  state {sim.state}')
+        return
+    if args.bench is not None:
+        results = run_benchmarks(args.bench)
+        if args.bench_out:
+            with open(args.bench_out, 'w') as f:
+                json.dump(results, f, indent=2)
+        if args.bench_compare:
+            with open(args.bench_compare) as f:
+                lines, regressions = compare_benchmarks(results, json.load(f))
+            print('\n'.join(lines))
+            if regressions:
+                sys.exit(1)
+        elif not args.bench_out:
+            print(json.dumps(results, indent=2))
+        return
+    if args.capture:
+        capture = FrameCapture(args.capture_mode, args.capture_scale, args.capture_gray, args.capture_skip)
+        seed = args.seed or 0
+        start = time.perf_counter()
+        frames = capture_game(seed, args.capture_frames, capture, args.max_steps, args.paddle == 'scripted')
+        elapsed = time.perf_counter() - start
+        np.savez_compressed(args.capture, frames=frames, seed=seed, scale=args.capture_scale, skip=args.capture_skip)
+        print(f'{len(frames)} frames {frames.shape[1:]} in {elapsed:.2f}s -> {args.capture}')
+        return
+    if args.batch:
+        summary = run_batch(args.batch, args.seed or 0, args.workers, args.max_steps, args.paddle == 'scripted',
+                            args.powerup_chance, args.bomb_chance)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print(format_batch(summary))
+        return
+    profile = StartupProfile() if args.profile_startup else None
+    Game(dirty_rects=args.dirty_rects, seed=args.seed, record=args.record, profile=profile,
+         trace=args.profile_trace).run()
 
 if __name__ == '__main__':
-    Game().run()
+    main()